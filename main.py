@@ -19,10 +19,16 @@
 import os, sys, json, time, base64, pathlib, logging, re, random, hashlib, datetime as dt
 from typing import Any, Dict, List, Optional, Tuple
 from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
 
 import requests
+from requests.adapters import HTTPAdapter
+try:
+    import orjson
+except ImportError:  # pragma: no cover - 없으면 표준 json
+    orjson = None
 from flask import Flask, request, jsonify, Response
-from functools import wraps
+from functools import wraps, lru_cache
 from jinja2 import Template
 
 # ---- (선택) GSC용 라이브러리 ----
@@ -90,6 +96,7 @@ API_VERSION         = env_str("SHOPIFY_API_VERSION", "2025-07")
 ADMIN_TOKEN         = env_str("SHOPIFY_ADMIN_TOKEN", "").strip()
 
 SEO_LIMIT           = env_int("SEO_LIMIT", 10)
+SEO_OPTIMIZE_WORKERS = max(1, env_int("SEO_OPTIMIZE_WORKERS", 4))  # /seo/optimize 상품별 업데이트 동시 실행 수
 USE_GRAPHQL         = env_bool("USE_GRAPHQL", True)
 
 PRIMARY_SITEMAP     = env_str("PRIMARY_SITEMAP", "https://jeffsfavoritepicks.com/sitemap.xml").strip()
@@ -120,6 +127,8 @@ SEO_TREND_LOOKBACK_DAYS   = env_int("SEO_TREND_LOOKBACK_DAYS", 28)
 SEO_TREND_TOP_N           = env_int("SEO_TREND_TOP_N", 50)
 SEO_TREND_MIN_IMPRESSIONS = env_int("SEO_TREND_MIN_IMPRESSIONS", 30)
 SEO_TREND_BLACKLIST       = [x.strip().lower() for x in env_str("SEO_TREND_BLACKLIST","").split(",") if x.strip()]
+# 블랙리스트 단어별 부분문자열 검사 대신 정규식 한 번으로 (긴 단어 우선)
+_RE_TREND_BLACKLIST = re.compile("|".join(map(re.escape, sorted(SEO_TREND_BLACKLIST, key=len, reverse=True)))) if SEO_TREND_BLACKLIST else None
 
 # Keyword map config
 KEYWORD_MIN_LEN         = env_int("KEYWORD_MIN_LEN", 3)
@@ -195,25 +204,55 @@ def require_auth(fn):
         return fn(*a, **kw)
     return wrapper
 
+def _retry_after(r) -> float:
+    try: return float((r.headers or {}).get("Retry-After") or 0) if r is not None else 0.0
+    except (TypeError, ValueError): return 0.0  # HTTP-date 형식은 무시
+
 def retry(max_attempts=3, base_delay=0.6, factor=2.0, allowed=(429,500,502,503,504)):
     def deco(fn):
         @wraps(fn)
         def inner(*a, **kw):
             delay = base_delay
             for i in range(1, max_attempts+1):
+                wait = delay
                 try: return fn(*a, **kw)
                 except requests.HTTPError as e:
                     st = e.response.status_code if e.response is not None else None
                     if i>=max_attempts or st not in allowed: raise
+                    wait = max(delay, _retry_after(e.response))  # 429 는 서버가 알려준 시간보다 짧게 쉬지 않는다
                 except Exception:
                     if i>=max_attempts: raise
-                time.sleep(delay); delay *= factor
+                time.sleep(wait); delay *= factor
         return inner
     return deco
 
+def _json(r) -> Any:
+    """응답 본문 파싱 — orjson 이 있으면 r.json() 보다 빠르게"""
+    return orjson.loads(r.content) if orjson is not None else r.json()
+
+# 호출마다 새 연결(TLS 핸드셰이크)을 열지 않도록 keep-alive 풀을 공유
+HTTP = requests.Session()
+HTTP.mount("https://", HTTPAdapter(pool_connections=32, pool_maxsize=32, max_retries=0))
+
+SHOPIFY_REST_LEAK = 2.0  # REST leaky bucket 초당 회복량 (Standard 플랜)
+SHOPIFY_REST_PACE_MAX = 1.5  # Flask 요청 스레드/최적화 워커 안에서 도는 대기라 짧게 — 진짜 429 는 retry 의 Retry-After 가 처리
+
+def _throttle_rest(r) -> None:
+    """X-Shopify-Shop-Api-Call-Limit 가 80% 이상이면 조금 쉰다 (최대 SHOPIFY_REST_PACE_MAX 초). 성공 응답에만"""
+    if r.status_code >= 400: return
+    used, _, cap = (r.headers.get("X-Shopify-Shop-Api-Call-Limit") or "").partition("/")
+    if not (used.isdigit() and cap.isdigit()) or int(cap) <= 0: return
+    used_n, cap_n = int(used), int(cap)
+    if used_n >= cap_n * 0.8:
+        time.sleep(min(SHOPIFY_REST_PACE_MAX, (used_n - cap_n * 0.5) / SHOPIFY_REST_LEAK))
+
 @retry()
 def http(method, url, **kw):
-    r = requests.request(method, url, timeout=30, **kw)
+    if orjson is not None and "json" in kw:  # 본문 직렬화도 orjson 으로
+        kw["data"] = orjson.dumps(kw.pop("json"))
+        kw["headers"] = {"Content-Type": "application/json", **(kw.get("headers") or {})}
+    r = HTTP.request(method, url, timeout=30, **kw)
+    _throttle_rest(r)
     if r.status_code >= 400:
         log.error("HTTP %s %s -> %s", method, url, r.status_code)
         r.raise_for_status()
@@ -227,10 +266,14 @@ BASE_GRAPHQL = f"https://{SHOPIFY_STORE}.myshopify.com/admin/api/{API_VERSION}/g
 HEADERS_REST = {"X-Shopify-Access-Token": ADMIN_TOKEN, "Content-Type":"application/json","Accept":"application/json"}
 HEADERS_GQL  = {"X-Shopify-Access-Token": ADMIN_TOKEN, "Content-Type":"application/json","Accept":"application/json"}
 
+# 미리보기/최적화/IndexNow 가 읽는 필드만 — variants/options 등을 받지 않아 응답이 작아진다
+PRODUCT_LIST_FIELDS = "id,title,handle,body_html,tags,images"
+
 @retry()
 def shopify_get_products(limit=SEO_LIMIT):
-    r = http("GET", f"{BASE_REST}/products.json", headers=HEADERS_REST, params={"limit":min(250,int(limit))})
-    return r.json().get("products", [])
+    r = http("GET", f"{BASE_REST}/products.json", headers=HEADERS_REST,
+             params={"limit":min(250,int(limit)), "fields":PRODUCT_LIST_FIELDS})
+    return _json(r).get("products", [])
 
 def _gql_products_page(after=None, page_size=250)->dict:
     q = {
@@ -251,7 +294,7 @@ def _gql_products_page(after=None, page_size=250)->dict:
         "variables":{"first":min(250,page_size),"after":after}
     }
     r = http("POST", BASE_GRAPHQL, headers=HEADERS_GQL, json=q)
-    return r.json()["data"]["products"]
+    return _json(r)["data"]["products"]
 
 def _edge_to_restish(n:dict)->dict:
     imgs = [{"src":e["node"]["url"],"alt":e["node"]["altText"] or ""} for e in (n.get("images",{}).get("edges") or [])]
@@ -287,7 +330,7 @@ def shopify_update_seo_rest(pid:int, meta_title:Optional[str], meta_desc:Optiona
     if meta_desc  is not None: payload["product"]["metafields_global_description_tag"] = meta_desc
     if body_html is not None:  payload["product"]["body_html"] = body_html
     r = http("PUT", f"{BASE_REST}/products/{pid}.json", headers=HEADERS_REST, json=payload)
-    return r.json()
+    return _json(r)
 
 @retry()
 def shopify_update_seo_graphql(gid:str, seo_title:Optional[str], seo_desc:Optional[str], body_html:Optional[str]=None):
@@ -305,7 +348,7 @@ def shopify_update_seo_graphql(gid:str, seo_title:Optional[str], seo_desc:Option
            **({"descriptionHtml":body_html} if body_html is not None else {})
        }}}
     r = http("POST", BASE_GRAPHQL, headers=HEADERS_GQL, json=m)
-    data = r.json().get("data",{}).get("productUpdate")
+    data = _json(r).get("data",{}).get("productUpdate")
     errs = (data or {}).get("userErrors") or []
     if not data or errs: return {"ok":False,"errors":errs or ["no productUpdate data"]}
     return {"ok":True,"data":data}
@@ -330,17 +373,21 @@ INTENT_LEX = {
  "transactional":["buy","price","coupon","free shipping","order","checkout","shop","sale"]
 }
 
+# 키워드별 단어경계 패턴은 한 번만 컴파일 (호출마다 ~30개 패턴을 다시 만들지 않도록)
+_INTENT_RES = {intent: [re.compile(rf"\b{re.escape(k)}\b") for k in keys] for intent, keys in INTENT_LEX.items()}
+
 def classify_intent_from_text(text:str)->str:
     if not INTENT_CLASSIFY: return "unknown"
     t = (text or "").lower(); score={"informational":0,"commercial":0,"transactional":0}
-    for intent, keys in INTENT_LEX.items():
-        for k in keys:
-            if re.search(rf"\b{re.escape(k)}\b", t): score[intent] += 1
+    for intent, pats in _INTENT_RES.items():
+        score[intent] += sum(1 for pat in pats if pat.search(t))
     intent = max(score, key=score.get)
     return intent if score[intent] > 0 else "unknown"
 
+_RE_TAG = re.compile(r"<[^>]+>"); _RE_WS = re.compile(r"\s+")
+
 def strip_html(s:str)->str:
-    s = re.sub(r"<[^>]+>"," ", s or ""); return re.sub(r"\s+"," ", s).strip()
+    s = _RE_TAG.sub(" ", s or ""); return _RE_WS.sub(" ", s).strip()
 
 def _safe_trim(s:str, mx:int)->str:
     if not s: return s
@@ -349,24 +396,35 @@ def _safe_trim(s:str, mx:int)->str:
     # 멀티바이트 안전 잘라내기
     return s.encode("utf-8")[:mx].decode("utf-8","ignore").rstrip(" .,|-·—–")
 
+_RE_WORD_SEP = re.compile(r"(\s+|-|/)"); _RE_NONWORD = re.compile(r"\W+")
+
 def title_case(s:str)->str:
     if not s: return s
-    words = re.split(r"(\s+|-|/)", str(s))
+    words = _RE_WORD_SEP.split(str(s))
     def tc(w):
-        if not w or re.fullmatch(r"\W+", w): return w
+        if not w or _RE_NONWORD.fullmatch(w): return w
         return w[0].upper()+w[1:].lower() if w.lower() not in {"for","and","or","to","of","a","an","the","in","on","at","by"} else w.lower()
     return "".join(tc(w) for w in words)
 
+_RE_TOKEN_SEP = re.compile(r"[_/|]")
+
+@lru_cache(maxsize=16)
+def _token_re(min_len:int) -> "re.Pattern[str]":
+    return re.compile(r"[a-z0-9\+\-]{%d,}"%max(1,min_len))
+
 def tokenize(text:str, min_len:int)->List[str]:
-    t = text.lower(); t = re.sub(r"[_/|]"," ", t)
-    return re.findall(r"[a-z0-9\+\-]{%d,}"%max(1,min_len), t)
+    t = text.lower(); t = _RE_TOKEN_SEP.sub(" ", t)
+    return _token_re(min_len).findall(t)
+
+_RE_NUMERIC = re.compile(r"\d[\d\-]*")
+_RE_NUMERIC_BIGRAM = re.compile(r"[\d\-\s]+")
 
 def filter_stopwords(tokens:List[str], min_len:int)->List[str]:
     out = []
     for w in tokens:
         if len(w)<min_len: continue
         if w in STOPWORDS: continue
-        if re.fullmatch(r"\d[\d\-]*", w): continue
+        if _RE_NUMERIC.fullmatch(w): continue
         out.append(w)
     return out
 
@@ -461,9 +519,11 @@ def inject_auto_alt_to_images(p:dict)->dict:
 # ─────────────────────────────────────────────────────────────
 # Product Registration (demo or batch)
 # ─────────────────────────────────────────────────────────────
+_RE_SLUG_DROP = re.compile(r"[^a-z0-9\- ]"); _RE_DASHES = re.compile(r"-{2,}")
+
 def _slugify(title:str)->str:
-    slug = re.sub(r"[^a-z0-9\- ]","",(title or "").lower()).strip()
-    slug = re.sub(r"\s+","-",slug); slug = re.sub(r"-{2,}","-",slug).strip("-")
+    slug = _RE_SLUG_DROP.sub("",(title or "").lower()).strip()
+    slug = _RE_WS.sub("-",slug); slug = _RE_DASHES.sub("-",slug).strip("-")
     return slug or f"prod-{int(time.time())}"
 
 def _normalize_product_payload(p:dict)->dict:
@@ -511,7 +571,7 @@ def _normalize_product_payload(p:dict)->dict:
 def _create_product(payload:dict)->dict:
     if DRY_RUN: return {"dry_run":True, "id":None}
     r = http("POST", f"{BASE_REST}/products.json", headers=HEADERS_REST, json=payload)
-    prod = r.json().get("product",{})
+    prod = _json(r).get("product",{})
     return {"id":prod.get("id"), "title":prod.get("title"), "handle":prod.get("handle"),
             "admin_url": f"https://admin.shopify.com/store/{SHOPIFY_STORE}/products/{prod.get('id')}" if prod.get("id") else None}
 
@@ -578,7 +638,7 @@ def _build_keyword_map(limit:int, min_len:int, include_bigrams:bool, scope:str="
         toks = filter_stopwords(tokenize(text, min_len), min_len)
         uni.update(toks)
         if include_bigrams:
-            bis = [b for b in bigrams(toks) if not any(w in STOPWORDS for w in b.split()) and not re.fullmatch(r"[\d\-\s]+", b)]
+            bis = [b for b in bigrams(toks) if not any(w in STOPWORDS for w in b.split()) and not _RE_NUMERIC_BIGRAM.fullmatch(b)]
             bi.update(bis)
     uni_top = uni.most_common(limit)
     bi_top  = bi.most_common(limit) if include_bigrams else []
@@ -675,7 +735,7 @@ def fetch_gsc_trends() -> List[Dict[str,Any]]:
             q = (r.get("keys",[None])[0] or "").strip()
             if not q: continue
             ql = q.lower()
-            if SEO_TREND_BLACKLIST and any(b in ql for b in SEO_TREND_BLACKLIST): continue
+            if _RE_TREND_BLACKLIST and _RE_TREND_BLACKLIST.search(ql): continue
             imp = int(r.get("impressions",0))
             if imp < SEO_TREND_MIN_IMPRESSIONS: continue
             clicks=int(r.get("clicks",0)); ctr=float(r.get("ctr",0)); pos=float(r.get("position",0))
@@ -719,25 +779,34 @@ def inject_related_links_bottom(body_html:str, related:List[dict])->str:
     block = "\n".join([RELATED_SECTION_MARKER,"<h3>Related Picks</h3>","<ul>",*lis,"</ul>"])
     return (body_html or "") + "\n\n" + block
 
+_RE_P_CLOSE = re.compile(r"(</p>)")
+
 def inject_related_links_top(html:str, related:List[dict])->str:
     if not related or RELATED_TOP_MARKER in (html or ""): return html
     picks = [f'<a href="/products/{rp.get("handle")}">{rp.get("title") or "View product"}</a>' for rp in related[:2]]
     block = RELATED_TOP_MARKER + f'\n<p>Quick Picks: {" · ".join(picks)}</p>\n'
-    if "</p>" in (html or ""): return re.sub(r"(</p>)", r"\1\n"+block, html, count=1)
+    if "</p>" in (html or ""): return _RE_P_CLOSE.sub(lambda m: m.group(1)+"\n"+block, html, count=1)
     return block + (html or "")
 
+_RE_PRODUCT_LINK = re.compile(r'href="/products/[^"]+"')
+
 def count_internal_links(body_html:str)->int:
-    return 0 if not body_html else len(re.findall(r'href="/products/[^"]+"', body_html))
+    return 0 if not body_html else len(_RE_PRODUCT_LINK.findall(body_html))
 
 # ─────────────────────────────────────────────────────────────
 # SEO Optimize (+ GSC trend boost) + Preview
 # ─────────────────────────────────────────────────────────────
 def _ensure_list(v): return v if isinstance(v,list) else ([v] if v else [])
 
+@lru_cache(maxsize=2048)
+def _kw_word_re(kw:str) -> "re.Pattern[str]":
+    """키워드별 단어 경계 패턴 — 상품마다 같은 키워드 목록을 다시 쓰므로 컴파일 결과를 재사용"""
+    return re.compile(rf"\b{re.escape(kw)}\b")
+
 def _score_kw(kw:str, title:str, body:str, tags:List[str], boost_set:set)->float:
-    s = 0.0; kw_re = rf"\b{re.escape(kw)}\b"
-    if re.search(kw_re, title): s += 2.0
-    if re.search(kw_re, body):  s += 1.0
+    s = 0.0; kw_re = _kw_word_re(kw)
+    if kw_re.search(title): s += 2.0
+    if kw_re.search(body):  s += 1.0
     if any(kw in (t or "").lower() for t in tags): s += 1.5
     if kw in boost_set: s *= 1.5
     if " " in kw: s *= 1.25
@@ -868,9 +937,8 @@ def seo_optimize():
     targets = prods[:limit] if not rotate else prods[:limit]
     all_candidates = shopify_get_all_products(max_items=600) if inject_rel else []
 
-    changed, errors = [], []
-
-    for p in targets:
+    def optimize_one(p):
+        """('changed'|'error', item) — 상품 하나의 메타 생성 + 업데이트 (스레드에서 실행)"""
         pid = p.get("id"); gid = p.get("gid") or product_gid(pid)
         try:
             meta_title, meta_desc, chosen, intent = _build_meta_for_product(p, trend_keywords, boost_set, top_bigrams, top_unigrams)
@@ -892,8 +960,7 @@ def seo_optimize():
                     if updated_html != html_before: new_body = updated_html
 
             if (not force) and ok_len(existing_title,TITLE_MAX_LEN) and ok_len(existing_desc,DESC_MAX_LEN) and (new_body is None):
-                changed.append({"id":pid,"handle":p.get("handle"),"skipped_reason":"existing_seo_ok","intent":intent})
-                continue
+                return "changed", {"id":pid,"handle":p.get("handle"),"skipped_reason":"existing_seo_ok","intent":intent}
 
             if USE_GRAPHQL:
                 res = shopify_update_seo_graphql(gid, meta_title, meta_desc, body_html=new_body)
@@ -902,7 +969,7 @@ def seo_optimize():
             else:
                 res = shopify_update_seo_rest(pid, meta_title, meta_desc, body_html=new_body)
 
-            changed.append({
+            return "changed", {
                 "id":pid,"handle":p.get("handle"),
                 "metaTitle":meta_title,"metaDesc":meta_desc,
                 "keywords_used":chosen,"intent":intent,
@@ -910,10 +977,17 @@ def seo_optimize():
                 "body_updated": bool(new_body is not None),
                 "internal_link_count": count_internal_links(new_body if new_body is not None else html_before),
                 "result":res
-            })
+            }
         except Exception as e:
             log.exception("SEO update failed for %s", pid)
-            errors.append({"id":pid,"handle":p.get("handle"),"error":str(e)})
+            return "error", {"id":pid,"handle":p.get("handle"),"error":str(e)}
+
+    # 상품별 Shopify 호출은 I/O 대기 — 스레드로 겹쳐 보내고 결과 순서는 입력 순서 그대로 (429 는 http() 재시도가 처리)
+    changed, errors = [], []
+    workers = min(SEO_OPTIMIZE_WORKERS, len(targets)) or 1
+    with ThreadPoolExecutor(max_workers=workers) as ex:
+        for kind, item in ex.map(optimize_one, targets):
+            (changed if kind == "changed" else errors).append(item)
 
     return jsonify({
         "ok":True,"action":"seo_optimize","limit":limit,"rotate":rotate,
@@ -936,7 +1010,7 @@ def _get_blog_id_by_handle(handle:str)->Optional[str]:
     q={"query":"query($h:String!){ blogByHandle(handle:$h){ id title handle }}","variables":{"h":handle}}
     try:
         r=http("POST", BASE_GRAPHQL, headers=HEADERS_GQL, json=q)
-        b=(r.json().get("data",{}).get("blogByHandle") or {})
+        b=(_json(r).get("data",{}).get("blogByHandle") or {})
         return b.get("id")
     except Exception:
         return None
@@ -948,7 +1022,7 @@ def _article_create(blog_id:str, title:str, html:str, tags:List[str])->Dict[str,
           articleCreate(input:$input){ article{ id handle onlineStoreUrl title } userErrors{ field message } }
         }""","variables":{"input":{"title":title,"contentHtml":html,"blogId":blog_id,"tags":tags}}}
     r=http("POST", BASE_GRAPHQL, headers=HEADERS_GQL, json=m)
-    data=r.json().get("data",{}).get("articleCreate"); errs=(data or {}).get("userErrors") or []
+    data=_json(r).get("data",{}).get("articleCreate"); errs=(data or {}).get("userErrors") or []
     return {"ok": not bool(errs), "article": (data or {}).get("article"), "errors":errs}
 
 def _blog_template(topic:str, products:List[dict], post_type:str, keywords:List[str])->Tuple[str,str]:
@@ -1191,7 +1265,7 @@ def health_shopify():
     base=f"https://{store}/admin/api/{api_v}"
     try:
         r=http("GET", f"{base}/shop.json", headers={"X-Shopify-Access-Token":token,"Accept":"application/json"})
-        try: body=r.json()
+        try: body=_json(r)
         except: body=(r.text or "")[:500]
         return jsonify({"ok":r.ok,"status":r.status_code,"endpoint":f"{base}/shop.json","domain":store,"api_version":api_v,"body":body}), (200 if r.ok else r.status_code)
     except Exception as e:
@@ -4,24 +4,48 @@
 run_all() 실행 순서:
   0) (옵션) AUTO IMPORT
   1) SEO UPDATE (필요할 때만 PUT; 드라이 모드 지원)
-  2) 사이트맵 핑
+  2) 사이트맵 URL 확인
   3) /report/add 로 데일리 리포트 기록
-  4) 이번 실행에서 실제 업데이트(또는 드라이 모드의 “업데이트 필요”)된 상품을 /tmp/last_updated_products.json 에 저장
+  4) 이번 실행에서 실제 업데이트(또는 드라이 모드의 “업데이트 필요”)된 상품을 /tmp/last_updated_products.jsonl 에 저장
+     (ts/dry/limit/count 는 /tmp/last_updated_summary.json)
 
 환경변수:
   SHOPIFY_STORE, SHOPIFY_ADMIN_TOKEN, SHOPIFY_API_VERSION, USER_AGENT
-  AUTO_IMPORT, PRODUCT_FEED_URL, MIN_PRICE
-  SEO_LIMIT, SEO_UPDATE_HANDLE, UPDATE_ALL_IMAGES_ALT
-  SEO_CURSOR_PATH, SITEMAP_URL
-  IMPORT_AUTH_TOKEN, PUBLIC_BASE_URL
-  OVERWRITE_ALWAYS
+  AUTO_IMPORT, PRODUCT_FEED_URL, FEED_CACHE_PATH, MIN_PRICE, IMPORT_BULK_MIN, IMPORT_GQL_BATCH, LIST_BULK_MIN
+  SEO_LIMIT, SEO_WORKERS, SEO_GQL_BATCH, SHOPIFY_REST_RATE, SEO_UPDATE_HANDLE, UPDATE_ALL_IMAGES_ALT
+  SEO_CURSOR_PATH, SEO_CURSOR_RESWEEP_DAYS, SEO_HASH_PATH, SITEMAP_URL, SITEMAP_CACHE_PATH
+  INDEXNOW_KEY, INDEXNOW_KEY_URL, CANONICAL_DOMAIN (main.py 의 /indexnow/submit 과 같은 설정)
+  IMPORT_AUTH_TOKEN, PUBLIC_BASE_URL, DEBUG_PROBE
+  OVERWRITE_ALWAYS, SEO_USE_GRAPHQL, LIST_USE_GRAPHQL, USE_GRAPHQL_BULK, SEO_ASYNC
 """
 
 from __future__ import annotations
-import os, re, time, json, logging
-from typing import Dict, Any, List, Optional, Tuple
+import os, re, sys, time, json, random, hashlib, logging, threading
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from datetime import datetime, timezone
 from pathlib import Path
 import requests
+from requests.adapters import HTTPAdapter
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows: O_EXCL 파일 + mtime TTL 로 대체
+    fcntl = None
+
+try:
+    import orjson  # JSON 디코드/인코드 가속 (없으면 stdlib json 폴백)
+except ImportError:  # pragma: no cover
+    orjson = None
+try:
+    import ijson  # 피드 스트리밍 파싱 (없으면 전체 로드 폴백)
+except ImportError:  # pragma: no cover
+    ijson = None
+try:
+    import ahocorasick  # 카테고리 키워드 단일 패스 매칭 (없으면 substring 루프 폴백)
+except ImportError:  # pragma: no cover
+    ahocorasick = None
 
 log = logging.getLogger(__name__)
 
@@ -39,6 +63,41 @@ try:
 except Exception:
     MIN_PRICE = 2.0
 
+try:
+    IMPORT_BULK_MIN = int(os.getenv("IMPORT_BULK_MIN", "50").strip() or 50)
+except Exception:
+    IMPORT_BULK_MIN = 50
+
+try:
+    IMPORT_GQL_BATCH = max(1, int(os.getenv("IMPORT_GQL_BATCH", "10").strip() or 10))  # bulk 미만일 때 productSet alias 묶음 크기 (1 = 건별 REST)
+except Exception:
+    IMPORT_GQL_BATCH = 10
+
+try:
+    LIST_BULK_MIN = int(os.getenv("LIST_BULK_MIN", "2000").strip() or 2000)  # 상품 수가 이 이상이면 bulk 목록 (0 = 자동 전환 끔)
+except Exception:
+    LIST_BULK_MIN = 2000
+
+try:
+    SEO_WORKERS = max(1, int(os.getenv("SEO_WORKERS", "8").strip() or 8))
+except Exception:
+    SEO_WORKERS = 8
+
+try:
+    SEO_GQL_BATCH = max(1, int(os.getenv("SEO_GQL_BATCH", "10").strip() or 10))  # mutation 1건에 묶을 상품 수
+except Exception:
+    SEO_GQL_BATCH = 10
+
+try:
+    REST_RATE = max(0.1, float(os.getenv("SHOPIFY_REST_RATE", "2").strip() or 2))  # 초당 보충량 (표준 플랜 2/s, 버킷 40)
+except Exception:
+    REST_RATE = 2.0
+
+try:
+    SEO_CURSOR_RESWEEP_SEC = int(float(os.getenv("SEO_CURSOR_RESWEEP_DAYS", "7").strip() or 7) * 86400)
+except Exception:
+    SEO_CURSOR_RESWEEP_SEC = 7 * 86400
+
 try:
     SEO_LIMIT = int(os.getenv("SEO_LIMIT", "10").strip() or 10)
 except Exception:
@@ -46,6 +105,10 @@ except Exception:
 SEO_UPDATE_HANDLE = os.getenv("SEO_UPDATE_HANDLE", "0").strip() == "1"
 UPDATE_ALL_IMAGES_ALT = os.getenv("UPDATE_ALL_IMAGES_ALT", "0").strip() == "1"
 OVERWRITE_ALWAYS = os.getenv("OVERWRITE_ALWAYS", "0").strip() == "1"
+SEO_USE_GRAPHQL = os.getenv("SEO_USE_GRAPHQL", "1").strip() == "1"
+SEO_ASYNC = os.getenv("SEO_ASYNC", "0").strip() == "1"
+LIST_USE_GRAPHQL = os.getenv("LIST_USE_GRAPHQL", "1").strip() == "1"  # 0 이면 REST products.json 페이지네이션
+USE_GRAPHQL_BULK = os.getenv("USE_GRAPHQL_BULK", "0").strip() == "1"  # 1 이면 전체 목록을 bulk query 로
 
 _default_cursor = Path("/data/seo_cursor.json")
 SEO_CURSOR_PATH = Path(os.getenv("SEO_CURSOR_PATH", str(_default_cursor)))
@@ -53,6 +116,10 @@ if not SEO_CURSOR_PATH.parent.exists():
     SEO_CURSOR_PATH = Path("/tmp/seo_cursor.json")
 
 SITEMAP_URL_ENV = os.getenv("SITEMAP_URL", "").strip()
+INDEXNOW_KEY = os.getenv("INDEXNOW_KEY", "").strip()  # 비어있으면 IndexNow 제출 안 함
+INDEXNOW_KEY_URL = os.getenv("INDEXNOW_KEY_URL", "").strip()  # 키 파일 위치 (keyLocation) — 없으면 https://{host}/{key}.txt
+CANONICAL_DOMAIN = os.getenv("CANONICAL_DOMAIN", "").strip()
+INDEXNOW_HOST = CANONICAL_DOMAIN or f"{STORE}.myshopify.com"  # main.py _indexnow_submit 과 같은 규칙
 PUBLIC_BASE_URL = os.getenv("PUBLIC_BASE_URL", "https://shopify-auto-import.onrender.com").strip()
 IMPORT_AUTH_TOKEN = os.getenv("IMPORT_AUTH_TOKEN", os.getenv("AUTH_TOKEN", "jeffshopsecure")).strip()
 
@@ -62,121 +129,593 @@ if not STORE:
 # ─────────────────────────────────────────────────────────────
 # HTTP
 SESSION = requests.Session()
+# 기본 풀(10)은 동시 요청 시 커넥션을 버리고 TLS 핸드셰이크를 반복 -> 풀 확장, 재시도는 _retry 가 담당
+# 워커 수가 풀보다 많으면 반납된 연결이 버려지므로 SEO_WORKERS 에 맞춰 키운다
+SESSION.mount("https://", HTTPAdapter(pool_connections=32, pool_maxsize=max(64, SEO_WORKERS * 2), max_retries=0))
+# 요청 본문은 json= 대신 data=_dumps(...) (orjson) 로 보내므로 Content-Type 은 세션에서 항상 지정
+SESSION.headers.update({"Content-Type": "application/json", "Accept": "application/json", "User-Agent": USER_AGENT})
 if TOKEN:
-    SESSION.headers.update({
-        "X-Shopify-Access-Token": TOKEN,
-        "Content-Type": "application/json",
-        "Accept": "application/json",
-        "User-Agent": USER_AGENT,
-    })
+    SESSION.headers["X-Shopify-Access-Token"] = TOKEN
 else:
     log.warning("[init] SHOPIFY_ADMIN_TOKEN 비어있음 — API 호출 시 401/403 가능")
 
+# Admin API 밖의 호스트(리포트/사이트맵/bulk 결과·스테이징 스토리지) — 토큰 헤더 없이 풀만 재사용
+EXT_SESSION = requests.Session()
+EXT_SESSION.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=8, max_retries=0))
+EXT_SESSION.mount("http://", HTTPAdapter(pool_connections=2, pool_maxsize=4, max_retries=0))
+EXT_SESSION.headers.update({"User-Agent": USER_AGENT})
+
 TIMEOUT = 20
 BASE = f"https://{STORE}.myshopify.com/admin/api/{API_VERSION}"
+GRAPHQL_URL = f"{BASE}/graphql.json"
 
-def _retry(func, *a, **k) -> requests.Response:
-    tries = int(k.pop("tries", 4)); backoff = float(k.pop("backoff", 1.2))
+class TokenBucket:
+    """스레드 공유 토큰 버킷 — 토큰이 모자라면 예약(음수)하고 부족분만큼 락 밖에서 대기"""
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate; self.capacity = capacity
+        self._tokens = capacity; self._ts = time.monotonic(); self._lock = threading.Lock()
+    def reserve(self, n: float = 1.0) -> float:
+        """토큰 n 개를 예약하고 기다려야 할 초를 돌려준다 (asyncio 쪽은 이 값으로 await asyncio.sleep)"""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._ts) * self.rate); self._ts = now
+            self._tokens -= n
+            return -self._tokens / self.rate if self._tokens < 0 else 0.0
+    def take(self, n: float = 1.0) -> None:
+        wait = self.reserve(n)
+        if wait > 0: time.sleep(wait)
+    def sync(self, used: int, cap: int) -> None:
+        """서버가 알려준 실제 사용량(X-Shopify-Shop-Api-Call-Limit: used/cap)에 맞춰 남은 토큰을 줄인다
+        — 같은 스토어를 쓰는 다른 앱이 버킷을 먹고 있어도 429 전에 속도를 낮춘다"""
+        with self._lock: self._tokens = min(self._tokens, float(cap - used))
+    def pause(self, seconds: float) -> None:
+        """429 를 받으면 재시도하는 스레드뿐 아니라 모든 호출자가 seconds 동안 쉬도록 버킷을 비운다"""
+        with self._lock: self._tokens = min(self._tokens, -seconds * self.rate)
+
+def _sync_call_limit(r: Any) -> None:  # requests / aiohttp 응답 모두 .headers 만 본다
+    used, _, cap = (r.headers.get("X-Shopify-Shop-Api-Call-Limit") or "").partition("/")
+    if used.isdigit() and cap.isdigit(): RATE.sync(int(used), int(cap))
+
+# REST Admin API 의 leaky bucket 과 같은 모양으로 미리 속도를 맞춘다 (GraphQL 은 비용 기반이라 제외)
+RATE = TokenBucket(rate=REST_RATE, capacity=40)
+
+def _rate_limited(url: Any) -> bool:
+    return isinstance(url, str) and url.startswith(BASE) and not url.startswith(GRAPHQL_URL)
+
+RETRY_CAP_SEC = 30.0
+
+def _backoff_delay(i: int, backoff: float, headers: Optional[Any] = None) -> float:
+    """지수 백오프 + full jitter. 서버가 Retry-After(초)를 주면 그보다 짧게 쉬지 않는다"""
+    delay = random.random() * min(RETRY_CAP_SEC, backoff * (2 ** i))
+    try: delay = max(delay, float((headers or {}).get("Retry-After") or 0))
+    except (TypeError, ValueError): pass  # HTTP-date 형식은 무시
+    return delay
+
+def _retry(func, *a, tries: int = 5, backoff: float = 1.0, **k) -> requests.Response:
     last: Optional[requests.Response | Exception] = None
+    limited = bool(a) and _rate_limited(a[0])
     for i in range(tries):
         try:
+            if limited: RATE.take()
             r: requests.Response = func(*a, timeout=TIMEOUT, **k)
+            if limited: _sync_call_limit(r)
             if r.status_code in (200, 201): return r
             if r.status_code in (429, 500, 502, 503, 504):
-                time.sleep(backoff * (i+1)); last = r; continue
+                last = r; delay = _backoff_delay(i, backoff, r.headers)
+                if limited and r.status_code == 429: RATE.pause(delay)
+                if i + 1 < tries: r.close(); time.sleep(delay)
+                continue
             return r
         except requests.RequestException as e:
-            last = e; time.sleep(backoff * (i+1)); continue
+            last = e
+            if i + 1 < tries: time.sleep(_backoff_delay(i, backoff))
+            continue
     if isinstance(last, requests.Response): return last
     raise RuntimeError("HTTP 요청 재시도 후 실패") from last  # type: ignore[arg-type]
 
+def _loads(data: bytes | str) -> Any:
+    return orjson.loads(data) if orjson is not None else json.loads(data)
+
+def _dumps(obj: Any) -> bytes:
+    if orjson is not None: return orjson.dumps(obj)
+    return json.dumps(obj, ensure_ascii=False).encode("utf-8")
+
+def _json(r: requests.Response) -> Any: return _loads(r.content)
+
+def _atomic_write(path: Path, data: bytes) -> None:
+    """같은 디렉터리 임시 파일에 쓰고 fsync 후 os.replace — 중간에 죽거나 전원이 나가도 반쯤 쓴 파일이 남지 않는다"""
+    tmp = path.with_name(path.name + ".tmp")
+    with open(tmp, "wb") as f:
+        f.write(data); f.flush(); os.fsync(f.fileno())
+    os.replace(tmp, path)
+
 def _get(url: str, **kw) -> requests.Response: return _retry(SESSION.get, url, **kw)
 def _post(url: str, **kw) -> requests.Response: return _retry(SESSION.post, url, **kw)
 def _put(url: str, **kw) -> requests.Response: return _retry(SESSION.put, url, **kw)
 
+# GraphQL Admin API 는 비용(point) 기반 버킷 — 기본값은 Standard 플랜(1000pt, 초당 50pt 회복)이고
+# 응답 extensions.cost.throttleStatus 를 받을 때마다 실제 값으로 맞춘다
+GQL_RATE = TokenBucket(rate=50, capacity=1000)
+GQL_DEFAULT_COST = 10.0
+# 쿼리 문자열 -> 마지막 requestedQueryCost (다음 호출 전 예약량). alias 배치는 배치 크기/미디어 구성마다
+# 문자열이 달라서 상주 프로세스에서는 끝없이 늘어난다 — 최근 GQL_COST_CACHE_MAX 개만 LRU 로 들고 있는다
+GQL_COST_CACHE_MAX = 256
+_GQL_COST: "OrderedDict[str, float]" = OrderedDict()
+_GQL_COST_LOCK = threading.Lock()
+
+def _gql_cost(query: str) -> float:
+    with _GQL_COST_LOCK:
+        cost = _GQL_COST.get(query)
+        if cost is not None: _GQL_COST.move_to_end(query)
+    return min(GQL_DEFAULT_COST if cost is None else cost, GQL_RATE.capacity)
+
+def _gql_cost_sync(query: str, body: Dict[str, Any]) -> None:
+    cost = (body.get("extensions") or {}).get("cost") or {}
+    if cost.get("requestedQueryCost") is not None:
+        with _GQL_COST_LOCK:
+            _GQL_COST[query] = float(cost["requestedQueryCost"]); _GQL_COST.move_to_end(query)
+            while len(_GQL_COST) > GQL_COST_CACHE_MAX: _GQL_COST.popitem(last=False)
+    ts = cost.get("throttleStatus") or {}
+    try: mx, cur, rr = float(ts["maximumAvailable"]), float(ts["currentlyAvailable"]), float(ts["restoreRate"])
+    except (KeyError, TypeError, ValueError): return
+    GQL_RATE.capacity = mx; GQL_RATE.rate = rr or GQL_RATE.rate
+    GQL_RATE.sync(int(mx - cur), int(mx))
+
+def _gql_throttled(errors: Any) -> bool:
+    return isinstance(errors, list) and any(((e or {}).get("extensions") or {}).get("code") == "THROTTLED" for e in errors)
+
+def _graphql(query: str, variables: Optional[Dict[str, Any]] = None, tries: int = 3) -> Dict[str, Any]:
+    payload = _dumps({"query": query, "variables": variables or {}})  # 직렬화는 한 번 — THROTTLED 재시도는 같은 bytes 재전송
+    for i in range(tries):
+        GQL_RATE.take(_gql_cost(query))
+        r = _post(GRAPHQL_URL, data=payload)
+        if r.status_code not in (200, 201):
+            raise RuntimeError(f"GraphQL HTTP {r.status_code}: {(r.text or '')[:300]}")
+        body = _json(r) or {}
+        _gql_cost_sync(query, body)
+        if body.get("errors"):
+            # THROTTLED 는 HTTP 200 으로 온다 — 버킷이 방금 실제 잔량으로 맞춰졌으니 다음 take() 가 회복 시간만큼 기다린다
+            if _gql_throttled(body["errors"]) and i + 1 < tries: continue
+            raise RuntimeError(f"GraphQL errors: {str(body['errors'])[:300]}")
+        return body.get("data") or {}
+    raise RuntimeError("GraphQL THROTTLED 재시도 후 실패")
+
 # ─────────────────────────────────────────────────────────────
 # Lock
 LOCK_PATH = Path("/tmp/seo.lock")
+LOCK_STALE_SEC = 20*60  # fcntl 없는 환경에서 이보다 오래된 락 파일은 죽은 프로세스 것으로 본다
+
+def _lock_holder_alive() -> bool:
+    """락 파일에 적힌 PID 가 살아있는지 — 확인 못 하면 살아있다고 본다 (mtime 기준 대기로 넘김)"""
+    try: pid = int(LOCK_PATH.read_text().strip() or 0)
+    except (OSError, ValueError): return True
+    if pid <= 0: return True
+    if os.name == "nt": return _win_pid_alive(pid)  # Windows 의 os.kill(pid, 0) 은 CTRL_C_EVENT 를 보낸다 — 쓰면 안 됨
+    try: os.kill(pid, 0)
+    except ProcessLookupError: return False
+    except OSError: return True  # PermissionError 등: 다른 사용자의 살아있는 프로세스
+    return True
+
+def _win_pid_alive(pid: int) -> bool:
+    """OpenProcess + GetExitCodeProcess 로 생존 확인 (신호를 보내지 않는다)"""
+    try:
+        import ctypes
+        k32 = ctypes.WinDLL("kernel32", use_last_error=True)  # type: ignore[attr-defined]
+    except Exception: return True  # pragma: no cover
+    h = k32.OpenProcess(0x1000, False, pid)  # PROCESS_QUERY_LIMITED_INFORMATION
+    if not h:
+        return ctypes.get_last_error() != 87  # ERROR_INVALID_PARAMETER = 그런 PID 없음, 그 외(접근 거부 등)는 살아있다고 본다
+    try:
+        code = ctypes.c_ulong()
+        if not k32.GetExitCodeProcess(h, ctypes.byref(code)): return True
+        return code.value == 259  # STILL_ACTIVE
+    finally:
+        k32.CloseHandle(h)
+
 class RunLock:
+    """fcntl.flock 기반 단일 실행 락 — 커널이 원자적으로 잡고, 프로세스 종료 시 자동 해제"""
+    def __init__(self):
+        self._fd: Optional[int] = None; self._excl = False
     def __enter__(self):
+        if fcntl is None: return self._enter_excl()
         try:
-            if LOCK_PATH.exists():
-                age = time.time() - LOCK_PATH.stat().st_mtime
-                if age < 20*60: raise RuntimeError("이미 실행 중으로 판단(락 존재)")
-                else: LOCK_PATH.unlink(missing_ok=True)
-            LOCK_PATH.write_text(str(int(time.time())), encoding="utf-8")
-        except Exception as e:
-            log.warning("[lock] 락 생성 실패(무시): %s", e)
+            fd = os.open(LOCK_PATH, os.O_CREAT | os.O_RDWR, 0o644)
+        except OSError as e:
+            log.warning("[lock] 락 파일 열기 실패(무시): %s", e); return self
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            os.close(fd); raise RuntimeError("이미 실행 중으로 판단(락 보유 프로세스 존재)")
+        self._fd = fd
+        try:
+            os.ftruncate(fd, 0); os.write(fd, str(os.getpid()).encode())
+        except OSError: pass
         return self
+    def _enter_excl(self):
+        for _ in range(2):
+            try:
+                fd = os.open(LOCK_PATH, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o644)
+            except FileExistsError:
+                try: age = time.time() - LOCK_PATH.stat().st_mtime
+                except OSError: continue  # 그 사이 해제됨 -> 다시 시도
+                if age < LOCK_STALE_SEC and _lock_holder_alive(): raise RuntimeError("이미 실행 중으로 판단(락 존재)")
+                LOCK_PATH.unlink(missing_ok=True); continue
+            except OSError as e:
+                log.warning("[lock] 락 생성 실패(무시): %s", e); return self
+            os.write(fd, str(os.getpid()).encode()); os.close(fd)
+            self._excl = True; return self
+        raise RuntimeError("이미 실행 중으로 판단(락 경합)")
     def __exit__(self, a,b,c):
-        try: LOCK_PATH.unlink(missing_ok=True)
-        except Exception: pass
+        if self._excl:
+            LOCK_PATH.unlink(missing_ok=True); self._excl = False
+        if self._fd is None: return
+        try: fcntl.flock(self._fd, fcntl.LOCK_UN)
+        finally:
+            os.close(self._fd); self._fd = None
 
 # ─────────────────────────────────────────────────────────────
 # List helpers
+HTTP_CACHE_DIR = Path("/tmp/shopify_cache")
+HTTP_CACHE_TTL = 2*86400  # 이만큼 쓰이지 않은 항목은 정리 대상 — 나이와 상관없이 항목은 항상 조건부 요청으로 재검증한다
+
+HTTP_CACHE_MAX_FILES = 2000  # page_info/updated_at_min 이 URL 마다 달라 항목이 계속 생긴다 — 개수도 제한
+HTTP_CACHE_PRUNE_SEC = 10*60  # 디렉터리 훑기는 이 간격에 한 번만 (쓰기마다가 아니라)
+_HTTP_CACHE_PRUNED_AT = 0.0
+
+def _cache_file(url: str) -> Path:
+    return HTTP_CACHE_DIR / (hashlib.sha1(url.encode("utf-8")).hexdigest() + ".json")
+
+def _prune_http_cache() -> None:
+    """HTTP_CACHE_TTL 동안 쓰이지 않은 항목을 지우고, 그래도 HTTP_CACHE_MAX_FILES 를 넘으면 오래된 것부터 지운다"""
+    global _HTTP_CACHE_PRUNED_AT
+    now = time.time()
+    if now - _HTTP_CACHE_PRUNED_AT < HTTP_CACHE_PRUNE_SEC: return
+    _HTTP_CACHE_PRUNED_AT = now
+    entries: List[Tuple[float, Path]] = []
+    for f in HTTP_CACHE_DIR.glob("*.json"):
+        try: entries.append((f.stat().st_mtime, f))
+        except OSError: continue
+    entries.sort(reverse=True)  # 최근에 쓰인 순
+    for i, (mtime, f) in enumerate(entries):
+        if i >= HTTP_CACHE_MAX_FILES or now - mtime >= HTTP_CACHE_TTL: f.unlink(missing_ok=True)
+
+def _get_cached(url: str, parse: Callable[[requests.Response], Any] = _json,
+                **kw) -> Tuple[requests.Response, Optional[Dict[str, Any]], str]:
+    """ETag/Last-Modified 조건부 GET — 304 면 디스크 캐시 본문/Link 재사용. (응답, 본문|None, Link)
+    캐시 항목은 오래됐어도 버리지 않고 재검증한다 (검증은 서버 몫 — 실행 간격이 길어도 304 를 받을 수 있다).
+    parse 가 돌려준 값이 본문으로 캐시된다 (필요한 필드만 남기면 캐시도 작아진다)"""
+    path = _cache_file(url); cached: Optional[Dict[str, Any]] = None
+    try:
+        if path.exists(): cached = _loads(path.read_bytes())
+    except Exception: cached = None
+    headers: Dict[str, str] = {}
+    if cached and cached.get("etag"): headers["If-None-Match"] = cached["etag"]
+    if cached and cached.get("last_modified"): headers["If-Modified-Since"] = cached["last_modified"]
+    r = _get(url, headers=headers or None, **kw)
+    if r.status_code == 304 and cached:
+        try: os.utime(path)  # 최근에 쓰인 항목 — 정리 대상에서 빠진다
+        except OSError: pass
+        return r, cached.get("body") or {}, cached.get("link") or ""
+    if r.status_code not in (200, 201): return r, None, ""
+    body = parse(r) or {}; link = r.headers.get("Link", "") or ""
+    etag, last_modified = r.headers.get("ETag"), r.headers.get("Last-Modified")
+    if etag or last_modified:
+        try:
+            HTTP_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+            _atomic_write(path, _dumps({"etag": etag, "last_modified": last_modified, "link": link, "body": body}))
+            _prune_http_cache()
+        except Exception as e:
+            log.warning("[cache] 저장 실패: %s", e)
+    return r, body, link
+
+_LINK_NEXT = re.compile(r'page_info=([^>;&]+)[^>]*>;\s*rel="next"')
+
+def _next_page_info(link: str) -> Optional[str]:
+    """Link 헤더에서 rel="next" 의 page_info 만 추출 (없으면 None)"""
+    m = _LINK_NEXT.search(link or "")
+    return m.group(1) if m else None
+
+_PRODUCTS_COUNT_QUERY = "query { productsCount { count } }"  # 기본 상한(10000)이어도 임계값 비교엔 충분
+
+def _bulk_listing_due() -> bool:
+    """USE_GRAPHQL_BULK=1 이거나, 상품 수가 LIST_BULK_MIN 이상이면 bulk — 작은 스토어는 폴링 대기보다 페이지 조회가 빠르다"""
+    if USE_GRAPHQL_BULK: return True
+    if LIST_BULK_MIN <= 0 or not LIST_USE_GRAPHQL: return False
+    try: n = int(((_graphql(_PRODUCTS_COUNT_QUERY).get("productsCount") or {}).get("count")) or 0)
+    except Exception as e:
+        log.info("[list] productsCount 조회 실패 -> 페이지 조회: %s", e); return False
+    if n >= LIST_BULK_MIN: log.info("[list] products=%d >= LIST_BULK_MIN=%d -> bulk", n, LIST_BULK_MIN)
+    return n >= LIST_BULK_MIN
+
 def list_all_products() -> List[Dict[str, Any]]:
+    if _bulk_listing_due():
+        try:
+            products = list_all_products_bulk()
+            log.info("[list] products fetched=%d (bulk)", len(products)); return products
+        except Exception as e:
+            log.warning("[list] bulk 목록 실패 -> 페이지 조회 폴백: %s", e)
+    if LIST_USE_GRAPHQL:
+        try:
+            products = [p for page in _iter_products_graphql() for p in page]
+            log.info("[list] products fetched=%d (graphql)", len(products)); return products
+        except Exception as e:
+            log.warning("[list] GraphQL 목록 실패 -> REST 폴백: %s", e)
+    return _list_all_products_rest()
+
+def _slim_rest_product(p: Dict[str, Any]) -> Dict[str, Any]:
+    """REST 상품(variants/options/body_html 등 수십 개 키) 중 SEO 단계가 읽는 값만 남긴다 — GraphQL 경로와 같은 모양"""
+    return {
+        "id": p.get("id"), "handle": p.get("handle"), "title": p.get("title"), "tags": p.get("tags") or "",
+        "status": sys.intern(p.get("status") or ""), "updated_at": p.get("updated_at"),
+        "metafields_global_title_tag": p.get("metafields_global_title_tag"),
+        "metafields_global_description_tag": p.get("metafields_global_description_tag"),
+        "images": [{"id": img.get("id"), "alt": img.get("alt")} for img in p.get("images") or []],
+    }
+
+# _slim_rest_product 가 읽는 최상위 필드만 요청 — variants/options/body_html 을 받지 않아 페이지 바이트가 크게 준다
+# (page_info 와 함께 허용되는 파라미터는 limit/fields 뿐이라 다음 페이지에도 그대로 붙일 수 있다)
+_REST_LIST_FIELDS = ",".join((
+    "id", "handle", "title", "tags", "status", "updated_at", "images",
+    "metafields_global_title_tag", "metafields_global_description_tag"))
+_PRODUCTS_LIST_URL = f"{BASE}/products.json?limit=250&fields={_REST_LIST_FIELDS}"
+
+def _parse_products_page(r: requests.Response) -> Dict[str, Any]:
+    """products.json 한 페이지 -> {"products": [slim...]}. ijson 이 있으면 상품 1개씩 읽어 바로 줄이므로
+    250개 전체 dict 트리(variants/options/body_html)를 한꺼번에 만들지 않는다"""
+    if ijson is not None:
+        r.raw.decode_content = True
+        items: Any = ijson.items(r.raw, "products.item", use_float=True)
+    else:
+        items = _json(r).get("products", []) or []
+    return {"products": [_slim_rest_product(p) for p in items]}
+
+def _list_all_products_rest(updated_at_min: Optional[str] = None) -> List[Dict[str, Any]]:
     products: List[Dict[str, Any]] = []; page_info: Optional[str] = None
     while True:
-        url = f"{BASE}/products.json?limit=250"
-        if page_info: url += f"&page_info={page_info}"
-        r = _get(url)
-        if r.status_code not in (200, 201):
+        url = _PRODUCTS_LIST_URL
+        if page_info: url += f"&page_info={page_info}"  # 필터는 page_info 안에 유지된다 — 첫 페이지에만 붙인다
+        elif updated_at_min: url += f"&updated_at_min={updated_at_min}"
+        r, body, link = _get_cached(url, _parse_products_page, stream=ijson is not None)
+        if body is None:
             log.error("[list] %s -> %s %s", url, r.status_code, (r.text or "")[:400]); break
-        batch = r.json().get("products", []) or []; products.extend(batch)
-        link = r.headers.get("Link", "") or ""
-        if 'rel="next"' in link:
-            m = re.search(r"page_info=([^>;]+)>; rel=\"next\"", link); page_info = m.group(1) if m else None
-            if not page_info: break
-        else: break
+        products.extend(body.get("products", []) or [])
+        page_info = _next_page_info(link)
+        if not page_info: break
     log.info("[list] products fetched=%d", len(products)); return products
 
-def _load_cursor() -> Optional[int]:
+_PRODUCTS_QUERY = """
+query($first: Int!, $after: String, $query: String) {
+  products(first: $first, after: $after, query: $query, sortKey: UPDATED_AT) {
+    edges { node {
+      id handle title tags status updatedAt
+      seo { title description }
+      media(first: 20) { pageInfo { hasNextPage } edges { node { ... on MediaImage { id alt image { id } } } } }
+    } }
+    pageInfo { hasNextPage endCursor }
+  }
+}"""
+GQL_PAGE_SIZE = 40  # media(first:20) 포함 쿼리 비용이 1000pt 한도 안에 들도록
+
+def _gid_num(gid: str) -> int: return int(str(gid).rsplit("/", 1)[-1])
+
+def _gql_product_to_rest(n: Dict[str, Any]) -> Dict[str, Any]:
+    """GraphQL product 노드 -> 이 모듈이 쓰는 REST 형태 dict"""
+    seo = n.get("seo") or {}; media = n.get("media") or {}
+    out: Dict[str, Any] = {
+        "id": _gid_num(n["id"]), "handle": n.get("handle"), "title": n.get("title"),
+        "tags": ", ".join(n.get("tags") or []), "status": sys.intern((n.get("status") or "").lower()),
+        "updated_at": n.get("updatedAt"),
+        "metafields_global_title_tag": seo.get("title"),
+        "metafields_global_description_tag": seo.get("description"),
+        # REST 이미지 id(ProductImage) 와 productUpdateMedia 용 MediaImage id 를 함께 보관 (영상 등은 빈 노드)
+        "images": [{"id": _gid_num(m["image"]["id"]), "alt": m.get("alt"), "media_id": m["id"]}
+                   for m in (e["node"] for e in (media.get("edges") or []))
+                   if m.get("id") and m.get("image")],
+    }
+    # media(first:20) 뒤에 더 있으면 표시 — _complete_media 가 REST 로 전체 이미지를 다시 받고, 해시 스킵에서도 뺀다
+    if (media.get("pageInfo") or {}).get("hasNextPage"): out["media_truncated"] = True
+    return out
+
+_PRODUCT_IMAGES_URL = f"{BASE}/products/{{}}/images.json?fields=id,alt"
+
+def _media_partial(p: Dict[str, Any]) -> bool:
+    """이미지 목록이 잘렸고 전체 ALT 를 봐야 하는 상품 (첫 이미지만 쓰는 설정이면 20개로 충분)"""
+    return UPDATE_ALL_IMAGES_ALT and bool(p.get("media_truncated"))
+
+def _fetch_all_images(p: Dict[str, Any]) -> Dict[str, Any]:
+    """REST images.json 으로 전체 이미지 -> media_id 없는 목록이라 쓰기도 전체 목록을 아는 REST 경로로 간다"""
+    try:
+        r = _get(_PRODUCT_IMAGES_URL.format(p["id"]))
+        if r.status_code != 200:
+            log.warning("[list] 전체 이미지 조회 실패 pid=%s -> %s", p["id"], r.status_code); return p
+        return dict(p, images=[{"id": img.get("id"), "alt": img.get("alt")} for img in _json(r).get("images") or []])
+    except Exception as e:
+        log.warning("[list] 전체 이미지 조회 실패 pid=%s: %s", p["id"], e); return p
+
+def _complete_media(products: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    idx = [i for i, p in enumerate(products) if _media_partial(p)]
+    if not idx: return products
+    log.info("[list] media 20개 초과 상품 %d건 -> REST 로 전체 이미지 조회", len(idx))
+    for i, full in zip(idx, _IMG_POOL.map(_fetch_all_images, [products[i] for i in idx])): products[i] = full
+    return products
+
+def _iter_products_graphql(query: Optional[str] = None) -> Iterator[List[Dict[str, Any]]]:
+    """products(first/after) 를 끝까지 넘기며 페이지 단위로 REST 형태 dict 목록을 내준다"""
+    after: Optional[str] = None
+    while True:
+        page = _graphql(_PRODUCTS_QUERY, {"first": GQL_PAGE_SIZE, "after": after, "query": query}).get("products") or {}
+        yield [_gql_product_to_rest(e["node"]) for e in page.get("edges") or []]
+        info = page.get("pageInfo") or {}
+        if not info.get("hasNextPage"): return
+        after = info.get("endCursor")
+
+def _migrate_since_id(since_id: int) -> Dict[str, Any]:
+    """이전 버전의 {"since_id": N} 커서 -> 그 상품의 updatedAt 커서 (조회 실패 시 처음부터)"""
+    try:
+        node = _graphql("query($id: ID!) { product(id: $id) { updatedAt } }",
+                        {"id": f"gid://shopify/Product/{since_id}"}).get("product") or {}
+        if node.get("updatedAt"):
+            log.info("[cursor] since_id=%s -> updated_at=%s 로 변환", since_id, node["updatedAt"])
+            return {"updated_at": node["updatedAt"], "ids": [since_id]}
+    except Exception as e:
+        log.warning("[cursor] since_id 변환 실패: %s", e)
+    return {"updated_at": None, "ids": []}
+
+_BULK_PRODUCTS_QUERY = """
+{ products { edges { node {
+  id handle title tags status updatedAt
+  seo { title description }
+  media { edges { node { ... on MediaImage { id alt image { id } } } } }
+} } } }"""
+_BULK_QUERY_MUTATION = """
+mutation($query: String!) {
+  bulkOperationRunQuery(query: $query) { bulkOperation { id status } userErrors { field message } }
+}"""
+
+def list_all_products_bulk() -> List[Dict[str, Any]]:
+    """bulkOperationRunQuery 1회 + JSONL 다운로드로 전체 상품 목록 (페이지 왕복 없음). 실패 시 예외"""
+    run = _graphql(_BULK_QUERY_MUTATION, {"query": _BULK_PRODUCTS_QUERY}).get("bulkOperationRunQuery") or {}
+    if run.get("userErrors") or not run.get("bulkOperation"):
+        raise RuntimeError(f"bulkOperationRunQuery 실패: {run.get('userErrors')}")
+    op = _wait_bulk(run["bulkOperation"]["id"], "QUERY")
+    if op is None: raise RuntimeError("bulk query 폴링 타임아웃")
+    if op.get("status") != "COMPLETED": raise RuntimeError(f"bulk query status={op.get('status')} error={op.get('errorCode')}")
+    if not op.get("url"): return []  # 상품 0개
+    # JSONL: 상품 줄 다음에 __parentId 가 붙은 media 줄이 따로 온다 -> 상품 노드에 다시 붙인다
+    nodes: Dict[str, Dict[str, Any]] = {}
+    with EXT_SESSION.get(op["url"], stream=True, timeout=TIMEOUT) as res:
+        res.raise_for_status()
+        for line in res.iter_lines():
+            if not line: continue
+            obj = _loads(line); parent = obj.pop("__parentId", None)
+            if parent is None: nodes[obj["id"]] = dict(obj, media={"edges": []})
+            elif parent in nodes and obj.get("id"): nodes[parent]["media"]["edges"].append({"node": obj})
+    return [_gql_product_to_rest(n) for n in nodes.values()]
+
+_LAST_CURSOR: Optional[Dict[str, Any]] = None  # 마지막으로 읽거나 쓴 커서 — 같으면 쓰기 생략
+
+def _seo_sig() -> str:
+    """생성 규칙 서명(_seo_rules_sig) — 바뀌면 updated_at 커서 이전 상품도 다시 봐야 한다"""
+    return _seo_rules_sig()
+
+def _fresh_cursor() -> Dict[str, Any]:
+    return {"updated_at": None, "ids": [], "anchored": int(time.time()), "sig": _seo_sig()}
+
+def _load_cursor() -> Dict[str, Any]:
+    """{"updated_at": 마지막 처리 시각(UTC), "ids": 그 시각에 이미 처리한 상품 id,
+        "anchored": 이번 순회를 처음부터 시작한 시각, "sig": 생성 규칙 서명}
+    규칙이 바뀌었거나 SEO_CURSOR_RESWEEP_DAYS 가 지나면 처음부터 다시 순회 (바뀌지 않은 상품은 해시로 바로 스킵)"""
+    global _LAST_CURSOR
+    cursor = _fresh_cursor(); stored: Any = None
     try:
         if SEO_CURSOR_PATH.exists():
-            data = json.loads(SEO_CURSOR_PATH.read_text(encoding="utf-8"))
-            v = int(data.get("since_id") or 0); return v if v>0 else None
+            data = stored = _loads(SEO_CURSOR_PATH.read_bytes())
+            if not data.get("updated_at") and data.get("since_id"):
+                data = _migrate_since_id(int(data["since_id"]))
+            if data.get("updated_at"):
+                loaded = {"updated_at": str(data["updated_at"]), "ids": [int(x) for x in data.get("ids") or []],
+                          "anchored": int(data.get("anchored") or cursor["anchored"]), "sig": data.get("sig") or cursor["sig"]}
+                if loaded["sig"] != cursor["sig"]:
+                    log.info("[cursor] SEO 생성 규칙 변경 -> 처음부터 다시 순회")
+                elif time.time() - loaded["anchored"] >= SEO_CURSOR_RESWEEP_SEC:
+                    log.info("[cursor] 순회 시작 후 %d일 경과 -> 처음부터 다시 순회", SEO_CURSOR_RESWEEP_SEC // 86400)
+                else:
+                    cursor = loaded
     except Exception: pass
-    return None
+    _LAST_CURSOR = cursor if stored == cursor else None  # 파일과 다르면(리셋/변환) 다음 저장 때 반드시 쓴다
+    return cursor
 
-def _save_cursor(since_id: Optional[int]) -> None:
+def _save_cursor(cursor: Dict[str, Any]) -> None:
+    global _LAST_CURSOR
+    if cursor == _LAST_CURSOR: return
     try:
         SEO_CURSOR_PATH.parent.mkdir(parents=True, exist_ok=True)
-        SEO_CURSOR_PATH.write_text(json.dumps({"since_id": since_id or 0}), encoding="utf-8")
+        _atomic_write(SEO_CURSOR_PATH, _dumps(cursor))
+        _LAST_CURSOR = cursor
     except Exception as e:
         log.warning("[cursor] 저장 실패: %s (path=%s)", e, SEO_CURSOR_PATH)
 
-def list_products_round_robin(limit: int) -> List[Dict[str, Any]]:
+def _advance_cursor(cursor: Dict[str, Any], batch: List[Dict[str, Any]]) -> Dict[str, Any]:
+    if not batch: return cursor
+    ts = max(p.get("updated_at") or "" for p in batch)
+    ids = [p["id"] for p in batch if p.get("updated_at") == ts]
+    if ts == cursor.get("updated_at"): ids = list(cursor.get("ids") or []) + ids
+    return dict(cursor, updated_at=ts, ids=ids)
+
+def _utc_ts(ts: Optional[str]) -> str:
+    """REST updated_at(상점 시간대 오프셋) -> GraphQL updatedAt 과 같은 UTC 'Z' 문자열 (커서 문자열 비교용)"""
+    if not ts: return ""
+    try: return datetime.fromisoformat(ts.replace("Z", "+00:00")).astimezone(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+    except ValueError: return ts
+
+def _round_robin_rest(since: Optional[str], seen: set) -> List[Dict[str, Any]]:
+    """GraphQL 을 못 쓸 때 — REST 는 updated_at 정렬이 없어서 updated_at_min 이후 전부 받은 뒤 정렬한다"""
+    items = [dict(p, updated_at=_utc_ts(p.get("updated_at"))) for p in _list_all_products_rest(since)]
+    items = [p for p in items if not (since and (p["updated_at"] < since or (p["updated_at"] == since and p["id"] in seen)))]
+    items.sort(key=lambda p: (p["updated_at"], p["id"]))
+    return items
+
+def list_products_round_robin(limit: int, cursor: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+    """updated_at 오름차순으로 커서 이후 변경된 상품만 가져온다 (커서 전진은 _advance_cursor)"""
     if limit <= 0: return list_all_products()
-    batch: List[Dict[str, Any]] = []; since_id = _load_cursor(); wrapped = False
-    while len(batch) < limit:
-        params = {"limit": min(250, limit-len(batch))}
-        if since_id: params["since_id"] = since_id
-        r = _get(f"{BASE}/products.json", params=params)
-        if r.status_code not in (200, 201):
-            log.error("[list-rr] HTTP %s: %s", r.status_code, (r.text or "")[:300]); break
-        items = r.json().get("products", []) or []
-        if not items:
-            if wrapped: break
-            wrapped = True; since_id = None; continue
-        batch.extend(items); since_id = items[-1].get("id")
-    _save_cursor(since_id)
-    log.info("[list-rr] round-robin fetched=%d (cursor=%s)", len(batch), since_id)
-    return batch[:limit]
+    cursor = cursor or _load_cursor()
+    since = cursor.get("updated_at"); seen = set(cursor.get("ids") or [])
+    query = f"updated_at:>='{since}'" if since else None
+    batch: List[Dict[str, Any]] = []
+    if LIST_USE_GRAPHQL:
+        try:
+            for page in _iter_products_graphql(query):
+                batch.extend(p for p in page if not (since and p["updated_at"] == since and p["id"] in seen))
+                if len(batch) >= limit: break
+            del batch[limit:]
+            log.info("[list-rr] round-robin fetched=%d (since=%s)", len(batch), since)
+            return batch
+        except Exception as e:
+            log.warning("[list-rr] GraphQL 목록 실패 -> REST 폴백: %s", e)
+    batch = _round_robin_rest(since, seen)
+    del batch[limit:]
+    log.info("[list-rr] round-robin fetched=%d (since=%s)", len(batch), since)
+    return batch
 
 # ─────────────────────────────────────────────────────────────
 # SEO helpers
-def _truncate(s: str, n: int) -> str:
-    s = s or ""; return s if len(s) <= n else (s[: max(0, n-1)] + "…")
+TITLE_SUFFIX = " | Jeff’s Favorite Picks"
+TITLE_MAX = 60
+DESC_MAX = 160
+_MAX_TITLE_BODY = TITLE_MAX - len(TITLE_SUFFIX)
+_DESC_TAIL = " for US/EU/CA. Fast shipping. Grab yours."
+SEO_RULES_VERSION = 1  # _seo_for 안의 문구(설명 앞머리, ALT 템플릿, 자르기 방식)를 바꾸면 올린다
+
+@lru_cache(maxsize=8)
+def _rules_digest(*parts: Any) -> str:
+    return hashlib.blake2b("\x1f".join(map(str, parts)).encode("utf-8"), digest_size=4).hexdigest()
+
+def _seo_rules_sig() -> str:
+    """make_seo 결과를 바꾸는 입력 전부(규칙 버전/접미사/길이 상한/설명 꼬리/플래그)의 서명 —
+    하나라도 바뀌면 nochange 해시가 전부 빗나가 모든 상품을 다시 비교한다"""
+    return _rules_digest(SEO_RULES_VERSION, TITLE_SUFFIX, TITLE_MAX, DESC_MAX, _DESC_TAIL,
+                         SEO_UPDATE_HANDLE, UPDATE_ALL_IMAGES_ALT)
+
+@lru_cache(maxsize=4096)
+def _seo_for(title: str, handle: str, tags: str) -> Tuple[str, str, str, str]:
+    handle = handle.strip().lower().replace(" ", "-")
+    main_kw = (tags.partition(",")[0] or title).strip()
+    # 접미사는 항상 유지하고 본문 쪽만 자른다
+    body = title if len(title) <= _MAX_TITLE_BODY else title[:_MAX_TITLE_BODY-1] + "…"
+    meta_title = body + TITLE_SUFFIX
+    # 입력을 먼저 상한 길이로 잘라 긴 본문/태그에서도 임시 문자열 크기가 DESC_MAX 수준을 넘지 않게 한다
+    # (잘린 뒤에도 결과가 DESC_MAX 를 넘으므로 아래 자르기 결과는 동일)
+    desc = f"Shop {title[:DESC_MAX]}. {main_kw[:DESC_MAX]}{_DESC_TAIL}"
+    meta_desc = desc if len(desc) <= DESC_MAX else desc[:DESC_MAX-1] + "…"
+    alt = f"{title} – {main_kw}"
+    # needs_update 가 매번 strip 하지 않도록 캐시에 정리된 값을 넣어 둔다
+    return handle.strip(), meta_title.strip(), meta_desc.strip(), alt.strip()
 
 def make_seo(product: Dict[str, Any]) -> Dict[str, str]:
     title = (product.get("title") or "").strip()
-    handle = (product.get("handle") or "").strip().lower().replace(" ", "-")
     tags = product.get("tags") or ""
     if isinstance(tags, list): tags = ", ".join(tags)
-    main_kw = (str(tags).split(",")[0] or title).strip()
-    meta_title = _truncate(f"{title} | Jeff’s Favorite Picks", 60)
-    meta_desc = _truncate(f"Shop {title}. {main_kw} for US/EU/CA. Fast shipping. Grab yours.", 160)
-    alt = f"{title} – {main_kw}"
+    handle, meta_title, meta_desc, alt = _seo_for(title, product.get("handle") or "", str(tags))
     return {
         "handle": handle,
         "metafields_global_title_tag": meta_title,
@@ -185,58 +724,182 @@ def make_seo(product: Dict[str, Any]) -> Dict[str, str]:
     }
 
 def needs_update(product: Dict[str, Any], seo: Dict[str, str]) -> Tuple[bool, str]:
-    cur_title = (product.get("metafields_global_title_tag") or "").strip()
-    cur_desc  = (product.get("metafields_global_description_tag") or "").strip()
-    new_title = seo["metafields_global_title_tag"].strip()
-    new_desc  = seo["metafields_global_description_tag"].strip()
-    if cur_title != new_title: return True, "title_diff"
-    if cur_desc != new_desc:   return True, "desc_diff"
-    if SEO_UPDATE_HANDLE:
-        cur_handle = (product.get("handle") or "").strip()
-        if cur_handle != (seo["handle"] or "").strip(): return True, "handle_diff"
+    """seo 는 make_seo 결과(이미 strip 된 값)라고 가정하고 상품 쪽 값만 정리해 비교"""
+    if (product.get("metafields_global_title_tag") or "").strip() != seo["metafields_global_title_tag"]:
+        return True, "title_diff"
+    if (product.get("metafields_global_description_tag") or "").strip() != seo["metafields_global_description_tag"]:
+        return True, "desc_diff"
+    if SEO_UPDATE_HANDLE and (product.get("handle") or "").strip() != seo["handle"]:
+        return True, "handle_diff"
     imgs = product.get("images") or []
-    new_alt = seo["alt_text"].strip()
     if not imgs: return False, "nochange"
+    new_alt = seo["alt_text"]
     if UPDATE_ALL_IMAGES_ALT:
-        for img in imgs:
-            if (img.get("alt") or "").strip() != new_alt: return True, "alt_diff_all"
-        return False, "nochange"
-    else:
-        first = imgs[0]
-        if (first.get("alt") or "").strip() != new_alt: return True, "alt_diff_first"
-        return False, "nochange"
-
-def update_product_seo(p: Dict[str, Any], seo: Dict[str, str]) -> Tuple[bool, str]:
-    if not OVERWRITE_ALWAYS:
-        need, why = needs_update(p, seo)
-        if not need: return False, "nochange"
-    else:
-        why = "force"
-    pid = p["id"]
-    r = _put(f"{BASE}/products/{pid}.json", json={"product": {
-        "id": pid,
-        **({"handle": seo["handle"]} if SEO_UPDATE_HANDLE else {}),
-        "metafields_global_title_tag": seo["metafields_global_title_tag"],
-        "metafields_global_description_tag": seo["metafields_global_description_tag"],
-    }})
-    ok1 = r.status_code in (200, 201)
-    ok2 = True
+        if any((img.get("alt") or "").strip() != new_alt for img in imgs): return True, "alt_diff_all"
+    elif (imgs[0].get("alt") or "").strip() != new_alt:
+        return True, "alt_diff_first"
+    return False, "nochange"
+
+_SEO_MUTATION = """
+mutation SeoUpdate($input: ProductInput!) {
+  productUpdate(input: $input) { product { id } userErrors { field message } }
+}"""
+
+_SEO_MEDIA_ONLY_MUTATION = """
+mutation SeoUpdate($productId: ID!, $media: [UpdateMediaInput!]!) {
+  productUpdateMedia(productId: $productId, media: $media) { media { id } mediaUserErrors { field message } }
+}"""
+
+_SEO_MEDIA_MUTATION = """
+mutation SeoUpdate($input: ProductInput!, $productId: ID!, $media: [UpdateMediaInput!]!) {
+  productUpdate(input: $input) { product { id } userErrors { field message } }
+  productUpdateMedia(productId: $productId, media: $media) { media { id } mediaUserErrors { field message } }
+}"""
+
+def _alt_targets(p: Dict[str, Any]) -> List[Dict[str, Any]]:
     images = p.get("images") or []
-    if images:
-        if UPDATE_ALL_IMAGES_ALT:
-            for img in images:
-                img_id = img.get("id")
-                if not img_id: continue
-                r2 = _put(f"{BASE}/products/{pid}/images/{img_id}.json",
-                          json={"image": {"id": img_id, "alt": seo["alt_text"]}})
-                ok2 = ok2 and (r2.status_code in (200, 201))
-        else:
-            img_id = images[0].get("id")
-            if img_id:
-                r2 = _put(f"{BASE}/products/{pid}/images/{img_id}.json",
-                          json={"image": {"id": img_id, "alt": seo["alt_text"]}})
-                ok2 = ok2 and (r2.status_code in (200, 201))
-    return (ok1 and ok2), why
+    targets = images if UPDATE_ALL_IMAGES_ALT else images[:1]
+    return [img for img in targets if img.get("id")]
+
+def _stale_alt_targets(p: Dict[str, Any], seo: Dict[str, str]) -> List[Dict[str, Any]]:
+    """ALT 대상 중 실제로 값이 다른 이미지만 (OVERWRITE_ALWAYS 면 전부)"""
+    targets = _alt_targets(p)
+    if OVERWRITE_ALWAYS: return targets
+    return [img for img in targets if (img.get("alt") or "").strip() != seo["alt_text"]]
+
+def _seo_fields_current(p: Dict[str, Any], seo: Dict[str, str]) -> bool:
+    """상품의 SEO title/description(+handle) 이 이미 목표값이면 상품 쪽 쓰기는 생략 (ALT 만 다른 경우)"""
+    if OVERWRITE_ALWAYS: return False
+    return ((p.get("metafields_global_title_tag") or "").strip() == seo["metafields_global_title_tag"]
+            and (p.get("metafields_global_description_tag") or "").strip() == seo["metafields_global_description_tag"]
+            and (not SEO_UPDATE_HANDLE or (p.get("handle") or "").strip() == seo["handle"]))
+
+def _graphql_writable(p: Dict[str, Any]) -> bool:
+    """ALT 대상 이미지마다 MediaImage id 가 있어야 한 번의 mutation 으로 처리 가능 (REST 목록 폴백 시엔 없음)"""
+    return all(img.get("media_id") for img in _alt_targets(p))
+
+def _seo_graphql_request(p: Dict[str, Any], seo: Dict[str, str]) -> Tuple[str, Dict[str, Any]]:
+    """title/description/handle + 이미지 ALT 를 담은 GraphQL (query, variables) 1건"""
+    gid = f"gid://shopify/Product/{p['id']}"
+    inp: Dict[str, Any] = {"id": gid, "seo": {
+        "title": seo["metafields_global_title_tag"],
+        "description": seo["metafields_global_description_tag"],
+    }}
+    if SEO_UPDATE_HANDLE: inp["handle"] = seo["handle"]
+    media = [{"id": img["media_id"], "alt": seo["alt_text"]} for img in _stale_alt_targets(p, seo)]
+    if media and _seo_fields_current(p, seo): return _SEO_MEDIA_ONLY_MUTATION, {"productId": gid, "media": media}
+    if media: return _SEO_MEDIA_MUTATION, {"input": inp, "productId": gid, "media": media}
+    return _SEO_MUTATION, {"input": inp}
+
+def _seo_graphql_errors(data: Dict[str, Any]) -> List[Any]:
+    errs = list((data.get("productUpdate") or {}).get("userErrors") or [])
+    errs += (data.get("productUpdateMedia") or {}).get("mediaUserErrors") or []
+    return errs
+
+def _seo_graphql_batch_request(items: List[Tuple[Dict[str, Any], Dict[str, str]]]) -> Tuple[str, Dict[str, Any]]:
+    """여러 상품의 productUpdate(+productUpdateMedia) 를 alias(p0, m0, p1, ...) 로 묶은 mutation 1건"""
+    decls: List[str] = []; fields: List[str] = []; variables: Dict[str, Any] = {}
+    for i, (p, seo) in enumerate(items):
+        v = _seo_graphql_request(p, seo)[1]
+        if "input" in v:  # SEO 필드가 이미 같으면 productUpdate 없이 ALT 만
+            decls.append(f"$in{i}: ProductInput!"); variables[f"in{i}"] = v["input"]
+            fields.append(f"p{i}: productUpdate(input: $in{i}) {{ product {{ id }} userErrors {{ field message }} }}")
+        if "media" in v:
+            decls += [f"$pid{i}: ID!", f"$media{i}: [UpdateMediaInput!]!"]
+            variables[f"pid{i}"] = v["productId"]; variables[f"media{i}"] = v["media"]
+            fields.append(f"m{i}: productUpdateMedia(productId: $pid{i}, media: $media{i}) "
+                          f"{{ media {{ id }} mediaUserErrors {{ field message }} }}")
+    return f"mutation SeoBatch({', '.join(decls)}) {{\n  " + "\n  ".join(fields) + "\n}", variables
+
+def _seo_graphql_batch_errors(data: Dict[str, Any], i: int) -> List[Any]:
+    errs = list((data.get(f"p{i}") or {}).get("userErrors") or [])
+    errs += (data.get(f"m{i}") or {}).get("mediaUserErrors") or []
+    return errs
+
+_PRODUCT_URL = f"{BASE}/products/{{}}.json"
+_IMAGE_URL = f"{BASE}/products/{{}}/images/{{}}.json"
+
+_SEO_KEYS = (("handle",) if SEO_UPDATE_HANDLE else ()) + (
+    "metafields_global_title_tag", "metafields_global_description_tag")
+
+def _seo_rest_requests(p: Dict[str, Any], seo: Dict[str, str], split: bool = False) -> List[Tuple[str, Dict[str, Any]]]:
+    """REST 폴백용 (url, body) 목록 — 기본은 images[] 를 실은 상품 PUT 1건, split=True 면 이미지별 PUT 추가
+
+    상품 PUT 의 images 배열은 전체 교체라서 빠진 이미지는 삭제된다 → 전체 이미지 목록을 아는
+    REST 목록 상품(media_id 없음)만 합치고, media(first:20) 로 잘렸을 수 있는 GraphQL 상품은 split.
+    """
+    pid = p["id"]
+    inner: Dict[str, Any] = {"id": pid}
+    fields_current = _seo_fields_current(p, seo)
+    if not fields_current:
+        for k in _SEO_KEYS: inner[k] = seo[k]
+    targets = _stale_alt_targets(p, seo); images = p.get("images") or []
+    if targets and not split and not any("media_id" in img for img in images):
+        tids = {img["id"] for img in targets}
+        inner["images"] = [{"id": img["id"], "alt": seo["alt_text"]} if img["id"] in tids else {"id": img["id"]}
+                           for img in images if img.get("id")]
+        return [(_PRODUCT_URL.format(pid), {"product": inner})]
+    # 값이 이미 같은 필드/이미지는 보내지 않는다 (쓸 게 없으면 상품 PUT 1건만 — needs_update 가 먼저 걸러서 보통은 안 옴)
+    reqs = [] if fields_current and targets else [(_PRODUCT_URL.format(pid), {"product": inner})]
+    for img in targets:
+        img_id = img["id"]
+        reqs.append((_IMAGE_URL.format(pid, img_id), {"image": {"id": img_id, "alt": seo["alt_text"]}}))
+    return reqs
+
+def _rest_image_errors(status: int, raw: bytes) -> bool:
+    """합친 상품 PUT 이 images 필드 때문에 거절됐는지 (422 + errors.images)"""
+    if status != 422: return False
+    try: errs = (_loads(raw) or {}).get("errors")
+    except Exception: return False
+    return isinstance(errs, dict) and "images" in errs
+
+def _update_seo_graphql(p: Dict[str, Any], seo: Dict[str, str]) -> bool:
+    errs = _seo_graphql_errors(_graphql(*_seo_graphql_request(p, seo)))
+    if errs:
+        log.warning("[seo] GraphQL userErrors pid=%s: %s", p["id"], str(errs)[:300]); return False
+    return True
+
+# 이미지별 PUT 은 서로 독립적(같은 상품의 다른 이미지) -> 작은 전용 풀로 겹쳐 보낸다.
+# SEO 워커 풀과 따로 두어야 워커가 자기 풀에 제출하고 기다리다 막히지 않는다. 속도는 RATE 버킷이 그대로 제한.
+_IMG_POOL = ThreadPoolExecutor(max_workers=4, thread_name_prefix="seo-img")
+
+def _put_status(req: Tuple[str, Dict[str, Any]]) -> int:
+    url, body = req
+    with _put(url, data=_dumps(body)) as r: return r.status_code
+
+def _update_seo_rest(p: Dict[str, Any], seo: Dict[str, str], split: bool = False) -> bool:
+    reqs = _seo_rest_requests(p, seo, split)
+    if split and len(reqs) > 1:
+        return all(code in (200, 201) for code in _IMG_POOL.map(_put_status, reqs))
+    ok = True
+    for url, body in reqs:
+        r = _put(url, data=_dumps(body))
+        if not split and _rest_image_errors(r.status_code, r.content):
+            log.warning("[seo] images[] 일괄 PUT 거절 -> 이미지별 PUT pid=%s", p["id"])
+            return _update_seo_rest(p, seo, split=True)
+        ok = (r.status_code in (200, 201)) and ok
+    return ok
+
+def _seo_need(p: Dict[str, Any], seo: Dict[str, str]) -> Optional[str]:
+    """업데이트 사유 (불필요하면 None)"""
+    if OVERWRITE_ALWAYS: return "force"
+    need, why = needs_update(p, seo)
+    return why if need else None
+
+def _write_seo(p: Dict[str, Any], seo: Dict[str, str]) -> bool:
+    """필요 여부는 이미 판단된 상태에서 실제 쓰기만 (GraphQL 우선, 실패 시 REST)"""
+    if SEO_USE_GRAPHQL and _graphql_writable(p):
+        try:
+            if _update_seo_graphql(p, seo): return True
+        except Exception as e:
+            log.warning("[seo] GraphQL 실패 -> REST 폴백 pid=%s: %s", p["id"], e)
+    return _update_seo_rest(p, seo)
+
+def update_product_seo(p: Dict[str, Any], seo: Dict[str, str], why: Optional[str] = "") -> Tuple[bool, str]:
+    """why 를 넘기면(_triage 결과 등) needs_update 를 다시 돌리지 않는다 — None 은 '변경 없음'으로 판정된 값"""
+    if why == "": why = _seo_need(p, seo)
+    if why is None: return False, "nochange"
+    return _write_seo(p, seo), why
 
 # ─────────────────────────────────────────────────────────────
 # AUTO IMPORT (옵션) — (생략 없이 동일)
@@ -244,29 +907,147 @@ ALLOW_CATEGORIES = {
     "phone","magsafe","charger","case","cable","stand","holder",
     "power bank","powerbank","pet","cat","dog","wearable"
 }
+_ALLOW_LIST = tuple(ALLOW_CATEGORIES)
+
+def _build_allow_automaton():
+    if ahocorasick is None: return None
+    ac = ahocorasick.Automaton()
+    for kw in _ALLOW_LIST: ac.add_word(kw, kw)
+    ac.make_automaton(); return ac
+
+_ALLOW_AC = _build_allow_automaton()
+# pyahocorasick 이 없을 때: 키워드 14개를 하나씩 훑는 대신 정규식 한 번으로 검사
+_ALLOW_RE = re.compile("|".join(map(re.escape, sorted(_ALLOW_LIST, key=len, reverse=True))))
+
+def _has_allowed_category(blob: str) -> bool:
+    if _ALLOW_AC is not None: return next(_ALLOW_AC.iter(blob), None) is not None
+    return _ALLOW_RE.search(blob) is not None
+
+class _Prefixed:
+    """이미 읽은 앞부분(head)을 되돌려 붙인 스트림 — ijson 에 그대로 넘긴다"""
+    def __init__(self, head: bytes, raw):
+        self._head = head; self._raw = raw
+    def read(self, n: int = -1) -> bytes:
+        if not self._head: return self._raw.read(n)
+        if n is None or n < 0:
+            out = self._head + self._raw.read(); self._head = b""; return out
+        out, self._head = self._head[:n], self._head[n:]
+        return out
+
+def _stream_items(raw) -> Iterator[Dict[str, Any]]:
+    head = b""
+    while True:
+        ch = raw.read(1)
+        if not ch: break
+        head += ch
+        if not ch.isspace(): break
+    first = head.strip()[:1]
+    if first == b"[": prefix = "item"
+    elif first == b"{": prefix = "items.item"
+    else:
+        log.warning("[import] 예상외 포맷: dict/list 아님 -> 스킵"); return
+    yield from ijson.items(_Prefixed(head, raw), prefix, use_float=True)
+
+def _feed_encodings() -> str:
+    # urllib3 는 brotli 패키지가 있을 때만 br 을 풀 수 있다
+    for mod in ("brotli", "brotlicffi"):
+        try: __import__(mod); return "gzip, deflate, br"
+        except ImportError: continue
+    return "gzip, deflate"
+
+# 피드는 외부 호스트 — Shopify 토큰이 붙은 SESSION 을 쓰지 않고 압축 전송을 명시적으로 요청
+FEED_SESSION = requests.Session()
+FEED_SESSION.mount("https://", HTTPAdapter(pool_connections=2, pool_maxsize=4, max_retries=0))
+FEED_SESSION.headers.update({"User-Agent": USER_AGENT, "Accept": "application/json", "Accept-Encoding": _feed_encodings()})
+
+# 피드 본문 + 검증자(ETag/Last-Modified) 디스크 캐시 — 바뀌지 않은 피드는 304 로 본문 없이 끝난다
+FEED_CACHE_PATH = Path(os.getenv("FEED_CACHE_PATH", "/tmp/feed.json").strip() or "/tmp/feed.json")
+FEED_META_PATH = FEED_CACHE_PATH.with_name(FEED_CACHE_PATH.stem + "_meta.json")
+
+def _feed_meta() -> Dict[str, Any]:
+    try: return dict(_loads(FEED_META_PATH.read_bytes())) if FEED_CACHE_PATH.exists() else {}
+    except Exception: return {}
+
+def _feed_conditional_headers(meta: Dict[str, Any]) -> Optional[Dict[str, str]]:
+    h = {}
+    if meta.get("etag"): h["If-None-Match"] = meta["etag"]
+    if meta.get("last_modified"): h["If-Modified-Since"] = meta["last_modified"]
+    return h or None
 
-def fetch_feed() -> List[Dict[str, Any]]:
+def _feed_items(data: Any) -> Iterator[Dict[str, Any]]:
+    if isinstance(data, dict) and "items" in data: yield from data["items"] or []
+    elif isinstance(data, list): yield from data
+    else: log.warning("[import] 예상외 포맷: dict/list 아님 -> 스킵")
+
+def _read_feed_cache() -> Iterator[Dict[str, Any]]:
+    if ijson is None:
+        yield from _feed_items(_loads(FEED_CACHE_PATH.read_bytes())); return
+    with open(FEED_CACHE_PATH, "rb") as f:
+        yield from _stream_items(f)
+
+class _Tee:
+    """읽은 바이트를 그대로 파일에도 쓰는 스트림 — 스트리밍 파싱하면서 캐시 본문을 남긴다"""
+    def __init__(self, raw, fh):
+        self._raw = raw; self._fh = fh
+    def read(self, n: int = -1) -> bytes:
+        chunk = self._raw.read(n)
+        if chunk: self._fh.write(chunk)
+        return chunk
+
+def _save_feed_meta(r: requests.Response) -> bool:
+    meta = {"etag": r.headers.get("ETag"), "last_modified": r.headers.get("Last-Modified")}
+    if not any(meta.values()): return False
+    try: _atomic_write(FEED_META_PATH, _dumps(meta)); return True
+    except Exception as e:
+        log.warning("[import] 피드 캐시 메타 저장 실패: %s", e); return False
+
+def _stream_and_cache(r: requests.Response) -> Iterator[Dict[str, Any]]:
+    """200 응답을 파싱하면서 FEED_CACHE_PATH 에 복사 — 끝까지 읽었을 때만 교체하고 검증자를 기록"""
+    if not (r.headers.get("ETag") or r.headers.get("Last-Modified")):
+        yield from _stream_items(r.raw); return
+    tmp = FEED_CACHE_PATH.with_name(FEED_CACHE_PATH.name + ".tmp")
+    try:
+        with open(tmp, "wb") as fh:
+            tee = _Tee(r.raw, fh)
+            yield from _stream_items(tee)
+            while tee.read(1 << 16): pass  # 마지막 아이템 뒤 꼬리까지 받아 캐시 본문을 완성
+        os.replace(tmp, FEED_CACHE_PATH); _save_feed_meta(r)
+    finally:
+        tmp.unlink(missing_ok=True)
+
+def fetch_feed() -> Iterator[Dict[str, Any]]:
+    """피드 아이템을 하나씩 yield — 다운로드가 끝나기 전에 임포트를 시작하고 메모리는 아이템 1개 분량만 사용
+    이전 응답의 ETag/Last-Modified 로 조건부 GET, 304 면 디스크에 남긴 본문을 다시 읽는다"""
     if not PRODUCT_FEED_URL:
-        log.info("[import] PRODUCT_FEED_URL 비어있음 -> 스킵"); return []
+        log.info("[import] PRODUCT_FEED_URL 비어있음 -> 스킵"); return
+    headers = _feed_conditional_headers(_feed_meta())
     try:
-        r = _get(PRODUCT_FEED_URL)
-        if r.status_code not in (200, 201):
-            log.error("[import] feed HTTP %s: %s", r.status_code, PRODUCT_FEED_URL); return []
-        data = r.json()
-        if isinstance(data, dict) and "items" in data: return data["items"] or []
-        if isinstance(data, list): return data
-        log.warning("[import] 예상외 포맷: dict/list 아님 -> 스킵"); return []
+        # 연결/헤더 단계만 재시도, 본문은 스트리밍
+        with _retry(FEED_SESSION.get, PRODUCT_FEED_URL, stream=True, headers=headers) as r:
+            if r.status_code == 304 and headers:
+                log.info("[import] feed 304 -> 캐시 본문 재사용: %s", FEED_CACHE_PATH)
+                yield from _read_feed_cache(); return
+            if r.status_code not in (200, 201):
+                log.error("[import] feed HTTP %s: %s", r.status_code, PRODUCT_FEED_URL); return
+            if ijson is None:
+                raw = r.content
+                if r.headers.get("ETag") or r.headers.get("Last-Modified"):
+                    try: _atomic_write(FEED_CACHE_PATH, raw); _save_feed_meta(r)
+                    except Exception as e: log.warning("[import] 피드 캐시 저장 실패: %s", e)
+                yield from _feed_items(_loads(raw)); return
+            r.raw.decode_content = True
+            yield from _stream_and_cache(r)
     except Exception as e:
-        log.exception("[import] 피드 로드 실패: %s", e); return []
+        log.exception("[import] 피드 로드 실패: %s", e)
 
 def should_exclude(item: Dict[str, Any]) -> (bool, str):
-    title = (item.get("title") or "").lower()
-    tags  = item.get("tags"); tags_text = " ".join(tags) if isinstance(tags, list) else str(tags or ""); tags_text = tags_text.lower()
+    title = item.get("title") or ""
+    tags  = item.get("tags"); tags_text = " ".join(tags) if isinstance(tags, list) else str(tags or "")
     try: price_val = float(str(item.get("price") or "0").replace("$","").strip() or 0)
     except ValueError: price_val = 0.0
     if price_val < MIN_PRICE: return True, f"price<{MIN_PRICE}"
-    blob = f"{title} {tags_text}"
-    if not any(kw in blob for kw in ALLOW_CATEGORIES): return True, "category_not_allowed"
+    blob = f"{title} {tags_text}".casefold()
+    if not _has_allowed_category(blob): return True, "category_not_allowed"
     if str(item.get("in_stock","true")).lower()=="false": return True, "oos"
     if str(item.get("shippable_to_na_eu","true")).lower()=="false": return True, "ship_unavailable"
     return False, ""
@@ -281,51 +1062,296 @@ def map_to_shopify(item: Dict[str, Any]) -> Dict[str, Any]:
     return {"product": {"title": title,"body_html": body_html,"vendor": vendor,"product_type": product_type,
                         "tags": tags,"status": status,"variants": [variant],"images": images}}
 
-def create_product(payload: Dict[str, Any]) -> requests.Response:
-    return _post(f"{BASE}/products.json", json=payload)
+def _parse_sku_page(r: requests.Response) -> Dict[str, Any]:
+    """products.json?fields=variants 한 페이지 -> {"skus": [...]} — 캐시에는 SKU 문자열만 남긴다"""
+    return {"skus": [v["sku"] for p in _json(r).get("products") or [] for v in p.get("variants") or [] if v.get("sku")]}
+
+def _existing_skus() -> set:
+    """스토어에 이미 있는 variant SKU — fields=variants 로 가볍게 한 바퀴 훑는다.
+    페이지마다 ETag 조건부 GET(_get_cached) 이라 카탈로그가 그대로면 304 로 디스크 캐시를 다시 쓴다"""
+    skus: set = set(); page_info: Optional[str] = None
+    while True:
+        url = f"{BASE}/products.json?limit=250&fields=variants"
+        if page_info: url += f"&page_info={page_info}"
+        r, body, link = _get_cached(url, _parse_sku_page)
+        if body is None:
+            log.warning("[import] SKU 조회 실패 %s -> %s", url, r.status_code); break
+        skus.update(body.get("skus") or [])
+        page_info = _next_page_info(link)
+        if not page_info: break
+    return skus
+
+def create_product(payload: Dict[str, Any], tries: int = 3) -> requests.Response:
+    """멱등이 아닌 생성 POST — 타임아웃/5xx 는 생성 여부를 모르므로 다시 보내지 않는다 (예외/응답 그대로).
+    실행되지 않은 게 확실한 429 만 Retry-After 만큼 쉬고 다시 보낸다"""
+    data = _dumps(payload)
+    for i in range(tries):
+        r = _retry(SESSION.post, f"{BASE}/products.json", tries=1, data=data)
+        if r.status_code != 429 or i + 1 >= tries: return r
+        r.close(); time.sleep(_backoff_delay(i, 1.0, r.headers))
+    return r
+
+# ── Bulk import (productSet + bulkOperationRunMutation)
+_PRODUCT_SET_MUTATION = (
+    "mutation call($input: ProductSetInput!) { productSet(input: $input) "
+    "{ product { id } userErrors { field message } } }"
+)
+_STAGED_UPLOAD_MUTATION = """
+mutation { stagedUploadsCreate(input: [{resource: BULK_MUTATION_VARIABLES, filename: "products.jsonl",
+  mimeType: "text/jsonl", httpMethod: POST}]) {
+  stagedTargets { url resourceUrl parameters { name value } }
+  userErrors { field message }
+} }"""
+_BULK_RUN_MUTATION = """
+mutation($mutation: String!, $path: String!) {
+  bulkOperationRunMutation(mutation: $mutation, stagedUploadPath: $path) {
+    bulkOperation { id status } userErrors { field message }
+  }
+}"""
+_BULK_STATUS_QUERY = ("query($type: BulkOperationType!) "
+                      "{ currentBulkOperation(type: $type) { id status errorCode objectCount url } }")
+BULK_POLL_SEC = 2.0
+BULK_TIMEOUT_SEC = 600
+
+def _wait_bulk(op_id: str, op_type: str) -> Optional[Dict[str, Any]]:
+    """bulk operation 이 끝날 때까지 폴링 -> 마지막 상태 dict (BULK_TIMEOUT_SEC 초과 시 None)"""
+    deadline = time.time() + BULK_TIMEOUT_SEC
+    while time.time() < deadline:
+        time.sleep(BULK_POLL_SEC)
+        op = _graphql(_BULK_STATUS_QUERY, {"type": op_type}).get("currentBulkOperation") or {}
+        if op.get("id") == op_id and op.get("status") in ("COMPLETED", "FAILED", "CANCELED", "EXPIRED"): return op
+    return None
+
+def to_product_set_input(payload: Dict[str, Any]) -> Dict[str, Any]:
+    """map_to_shopify() 의 REST 페이로드 -> GraphQL ProductSetInput"""
+    p = payload["product"]; v = (p.get("variants") or [{}])[0]
+    variant: Dict[str, Any] = {
+        "optionValues": [{"optionName": "Title", "name": "Default Title"}],
+        "price": v.get("price") or "0", "taxable": bool(v.get("taxable", True)),
+    }
+    if v.get("sku"): variant["inventoryItem"] = {"sku": v["sku"], "tracked": False}
+    tags = p.get("tags") or ""
+    return {
+        "title": p["title"], "descriptionHtml": p.get("body_html") or "",
+        "vendor": p.get("vendor"), "productType": p.get("product_type"),
+        "tags": [t.strip() for t in str(tags).split(",") if t.strip()],
+        "status": str(p.get("status") or "draft").upper(),
+        "productOptions": [{"name": "Title", "values": [{"name": "Default Title"}]}],
+        "variants": [variant],
+        "files": [{"originalSource": img["src"], "contentType": "IMAGE"} for img in (p.get("images") or [])],
+    }
+
+def _bulk_import(payloads: List[Dict[str, Any]]) -> Tuple[int, int]:
+    """JSONL 스테이징 업로드 후 bulk mutation 1회로 생성. 제출 전 실패와 확실한 거절만 예외(-> 건별 폴백)"""
+    jsonl = b"".join(_dumps({"input": to_product_set_input(pl)}) + b"\n" for pl in payloads)
+    staged = _graphql(_STAGED_UPLOAD_MUTATION).get("stagedUploadsCreate") or {}
+    targets = staged.get("stagedTargets") or []
+    if staged.get("userErrors") or not targets:
+        raise RuntimeError(f"stagedUploadsCreate 실패: {staged.get('userErrors')}")
+    target = targets[0]
+    params = {x["name"]: x["value"] for x in target.get("parameters") or []}
+    # 스테이징 URL 은 Shopify 외부 스토리지 — 토큰 헤더가 붙은 SESSION 대신 EXT_SESSION
+    up = EXT_SESSION.post(target["url"], data=params, files={"file": ("products.jsonl", jsonl, "text/jsonl")}, timeout=60)
+    if up.status_code >= 300:
+        raise RuntimeError(f"staged upload HTTP {up.status_code}: {(up.text or '')[:300]}")
+    # 제출 POST 가 나간 뒤의 실패(타임아웃/5xx/모호한 응답)는 Shopify 가 받았는지 알 수 없다 -> 폴백하지 않고 error 로 집계.
+    # 재전송 없는 _graphql_mutation 으로 보내고, 폴백(예외)은 bulkOperation 없이 userErrors 만 온 확실한 거절일 때뿐
+    try:
+        body = _graphql_mutation(_BULK_RUN_MUTATION, {"mutation": _PRODUCT_SET_MUTATION, "path": params.get("key", "")})
+    except Exception as e:
+        log.error("[import] bulk 제출 결과 불명(재생성 안 함) items=%d: %s", len(payloads), e); return 0, len(payloads)
+    run = (body.get("data") or {}).get("bulkOperationRunMutation") or {}
+    if run.get("userErrors") and not run.get("bulkOperation"):
+        raise RuntimeError(f"bulkOperationRunMutation 실패: {run.get('userErrors')}")
+    if not run.get("bulkOperation"):
+        log.error("[import] bulk 제출 응답에 op 없음(재생성 안 함): %s", str(body.get("errors") or body)[:300])
+        return 0, len(payloads)
+    op_id = run["bulkOperation"]["id"]
+    log.info("[import] bulk 제출: op=%s items=%d", op_id, len(payloads))
+
+    # 여기부터는 Shopify 가 이미 생성 중 — 예외를 밖으로 던지면 호출부가 같은 상품을 또 만든다 (폴백 금지)
+    try:
+        op = _wait_bulk(op_id, "MUTATION")
+    except Exception as e:
+        log.warning("[import] bulk 상태 조회 실패 — 백그라운드에서 계속 진행: op=%s: %s", op_id, e); return 0, 0
+    if op is None:
+        log.warning("[import] bulk 폴링 타임아웃 — 백그라운드에서 계속 진행: op=%s", op_id); return 0, 0
+    if op.get("status") != "COMPLETED" or not op.get("url"):
+        log.error("[import] bulk 종료 status=%s error=%s", op.get("status"), op.get("errorCode")); return 0, len(payloads)
+
+    imported = errors = 0
+    try:
+        with EXT_SESSION.get(op["url"], stream=True, timeout=TIMEOUT) as res:
+            for line in res.iter_lines():
+                if not line: continue
+                out = (_loads(line).get("data") or {}).get("productSet") or {}
+                if out.get("product") and not out.get("userErrors"): imported += 1
+                else:
+                    errors += 1; log.error("[import] bulk fail: %s", str(out.get("userErrors"))[:300])
+    except Exception as e:
+        log.warning("[import] bulk 결과 다운로드 실패 — 집계 %d/%d 까지만: op=%s: %s", imported + errors, len(payloads), op_id, e)
+    return imported, errors
+
+def _import_batch_request(payloads: List[Dict[str, Any]]) -> Tuple[str, Dict[str, Any]]:
+    """productSet 여러 건을 alias(s0, s1, ...) 로 묶은 mutation 1건 — 왕복 M 번 -> M/IMPORT_GQL_BATCH 번"""
+    decls = ", ".join(f"$in{i}: ProductSetInput!" for i in range(len(payloads)))
+    fields = "\n  ".join(f"s{i}: productSet(input: $in{i}) {{ product {{ id }} userErrors {{ field message }} }}"
+                         for i in range(len(payloads)))
+    return (f"mutation ImportBatch({decls}) {{\n  {fields}\n}}",
+            {f"in{i}": to_product_set_input(pl) for i, pl in enumerate(payloads)})
+
+def _graphql_mutation(query: str, variables: Dict[str, Any], tries: int = 3) -> Dict[str, Any]:
+    """멱등이 아닌 mutation 용 _graphql — 응답 body 전체(data + errors)를 돌려주고, POST 는 실행되지 않은 게
+    확실한 경우(HTTP 429, data 없는 THROTTLED)만 다시 보낸다. 전송 실패/5xx 는 실행 여부를 모르므로 예외"""
+    payload = _dumps({"query": query, "variables": variables})
+    for i in range(tries):
+        GQL_RATE.take(_gql_cost(query))
+        r = _retry(SESSION.post, GRAPHQL_URL, tries=1, data=payload)
+        if r.status_code == 429 and i + 1 < tries:
+            r.close(); time.sleep(_backoff_delay(i, 1.0, r.headers)); continue
+        if r.status_code not in (200, 201):
+            raise RuntimeError(f"GraphQL HTTP {r.status_code}: {(r.text or '')[:300]}")
+        body = _json(r) or {}
+        _gql_cost_sync(query, body)
+        if body.get("errors") and not body.get("data") and _gql_throttled(body["errors"]) and i + 1 < tries: continue
+        return body
+    raise RuntimeError("GraphQL THROTTLED 재시도 후 실패")
+
+def _import_graphql(pending: List[Tuple[str, Dict[str, Any]]]) -> Tuple[int, int, List[Tuple[str, Dict[str, Any]]]]:
+    """IMPORT_GQL_BATCH 개씩 productSet 배치 생성 -> (imported, errors, REST 로 다시 보낼 항목).
+    REST 로는 top-level errors 없이 userErrors 와 함께 product: null 로 돌아온 alias 만 보낸다.
+    실행 여부를 알 수 없는 실패(타임아웃/5xx, top-level errors 가 있는 응답의 product 없는 alias)는 다시 만들지 않고
+    error — 다음 실행의 SKU 중복 검사가 걸러서 재시도"""
+    imported = errors = 0; retry: List[Tuple[str, Dict[str, Any]]] = []
+    for j in range(0, len(pending), IMPORT_GQL_BATCH):
+        chunk = pending[j:j + IMPORT_GQL_BATCH]
+        try:
+            body = _graphql_mutation(*_import_batch_request([pl for _, pl in chunk]))
+        except Exception as e:
+            errors += len(chunk); log.error("[import] productSet 배치 실패(%d건, 생성 여부 불명 -> 재생성 안 함): %s", len(chunk), e)
+            continue
+        top_errors = body.get("errors")
+        if top_errors: log.warning("[import] productSet 배치 errors: %s", str(top_errors)[:300])
+        data = body.get("data") or {}
+        for k, (title, payload) in enumerate(chunk):
+            out = data.get(f"s{k}") or {}
+            if out.get("product"):  # 만들어졌으면 userErrors 가 있어도 다시 만들지 않는다
+                imported += 1; log.info("[import] ok: %s (pid=%s)", title, out["product"].get("id"))
+                if out.get("userErrors"): log.warning("[import] productSet userErrors %s: %s", title, str(out["userErrors"])[:300])
+                continue
+            if top_errors or not out.get("userErrors"):  # 거부가 아니라 결과 불명 — 이미 만들어졌을 수 있다
+                errors += 1; log.error("[import] productSet 결과 불명 %s (생성 여부 불명 -> 재생성 안 함)", title)
+                continue
+            log.warning("[import] productSet 미생성 %s: %s -> REST 폴백", title, str(out["userErrors"])[:300])
+            retry.append((title, payload))
+    return imported, errors, retry
 
 def run_auto_import() -> tuple[int,int,int]:
     if not AUTO_IMPORT:
         log.info("[import] AUTO_IMPORT=0 -> 스킵"); return 0,0,0
-    items = fetch_feed(); imported=skipped=errors=0
-    for it in items:
+    imported=skipped=errors=0
+    # 스트리밍 중에 바로 거른다: 제외/피드 내 중복 SKU 아이템은 payload 를 만들지도, 들고 있지도 않는다
+    # (스토어 SKU 조회는 피드를 다 읽은 뒤 — 스트림을 열어 둔 채 오래 멈추면 피드 서버가 끊을 수 있다)
+    candidates: List[Tuple[str, Optional[str], Dict[str, Any]]] = []; feed_skus: set = set()
+    for it in fetch_feed():
         try:
             ex, reason = should_exclude(it)
             if ex: skipped += 1; log.info("[import] skip: %s (%s)", it.get("title"), reason); continue
-            r = create_product(map_to_shopify(it))
+            sku = it.get("sku")
+            if sku and sku in feed_skus:
+                skipped += 1; log.info("[import] skip: %s (duplicate sku %s)", it.get("title"), sku); continue
+            candidates.append((it.get("title"), sku, map_to_shopify(it)))
+            if sku: feed_skus.add(sku)
+        except Exception as e:
+            errors += 1; log.exception("[import] exception %s: %s", it.get("title"), e)
+
+    pending: List[Tuple[str, Dict[str, Any]]] = []
+    if candidates:  # 이미 등록된 SKU 는 만들지 않는다
+        try: seen = _existing_skus()
+        except Exception as e: seen = set(); log.warning("[import] SKU 조회 실패 -> 중복 검사 생략: %s", e)
+        for title, sku, payload in candidates:
+            if sku and sku in seen:
+                skipped += 1; log.info("[import] skip: %s (duplicate sku %s)", title, sku); continue
+            pending.append((title, payload))
+
+    if pending and len(pending) >= IMPORT_BULK_MIN:
+        try:
+            i, e = _bulk_import([pl for _, pl in pending])
+            imported += i; errors += e; pending = []
+        except Exception as e:
+            log.exception("[import] bulk 제출 실패 -> 건별 폴백: %s", e)  # _bulk_import 는 제출 전 실패만 던진다
+
+    if pending and IMPORT_GQL_BATCH > 1:  # IMPORT_GQL_BATCH=1 이면 예전처럼 건별 REST 만
+        i, e, pending = _import_graphql(pending); imported += i; errors += e
+
+    for title, payload in pending:
+        try:
+            r = create_product(payload)
             if r.status_code in (200, 201):
-                imported += 1; pid = (r.json().get("product") or {}).get("id")
-                log.info("[import] ok: %s (pid=%s)", it.get("title"), pid)
+                imported += 1; pid = (_json(r).get("product") or {}).get("id")
+                log.info("[import] ok: %s (pid=%s)", title, pid)
             else:
-                errors += 1; log.error("[import] fail %s -> %s %s", it.get("title"), r.status_code, (r.text or "")[:300])
+                errors += 1; log.error("[import] fail %s -> %s %s", title, r.status_code, (r.text or "")[:300])
         except Exception as e:
-            errors += 1; log.exception("[import] exception %s: %s", it.get("title"), e)
+            errors += 1; log.exception("[import] exception %s: %s", title, e)
     log.info("[import_summary] imported=%d, skipped=%d, errors=%d", imported, skipped, errors)
     return imported, skipped, errors
 
 # ─────────────────────────────────────────────────────────────
 # Sitemap
 def _http_head_or_get(url: str) -> int:
-    try: return _get(url, allow_redirects=True).status_code
+    try:
+        with EXT_SESSION.head(url, allow_redirects=True, timeout=5) as r:
+            if r.status_code not in (405, 501): return r.status_code
+        # HEAD 미지원 서버
+        with EXT_SESSION.get(url, allow_redirects=True, stream=True, timeout=5) as r: return r.status_code
     except Exception: return 0
 
-def _ping_google(sitemap_url: str) -> int:
-    try: return _get(f"https://www.google.com/ping?sitemap={sitemap_url}").status_code
-    except Exception: return 0
+SITEMAP_CACHE = Path(os.getenv("SITEMAP_CACHE_PATH", "/tmp/sitemap_url.txt"))
+SITEMAP_CACHE_TTL = 7*86400  # 일주일에 한 번은 우선순위대로 전체 후보를 다시 확인
+_SITEMAP_CANDIDATES: Tuple[str, ...] = tuple(dict.fromkeys(u for u in (
+    SITEMAP_URL_ENV, f"https://{STORE}.myshopify.com/sitemap.xml", "https://jeffsfavoritepicks.com/sitemap.xml") if u))
+
+def _ok_status(code: int) -> bool: return 200 <= code < 400
 
 def resubmit_sitemap() -> None:
-    candidates = []
-    if SITEMAP_URL_ENV: candidates.append(SITEMAP_URL_ENV)
-    candidates.append(f"https://{STORE}.myshopify.com/sitemap.xml")
-    candidates.append("https://jeffsfavoritepicks.com/sitemap.xml")
-    used = None
-    for url in candidates:
-        code = _http_head_or_get(url)
-        if code and 200 <= code < 500:
-            used = url; status = _ping_google(url); log.info("[sitemap] Google ping %s (%s)", url, status); break
-    if not used:
-        last = candidates[-1] if candidates else "(없음)"
-        log.info("[sitemap] 유효 URL 찾지 못함, 마지막 후보 로그만: %s", last)
+    """사이트맵 후보를 병렬 HEAD 로 확인. Google sitemap ping 은 2023년 종료(404)되어 호출하지 않는다.
+    지난번에 유효했던 URL 을 먼저 한 번만 확인하고, 실패할 때만 전체 후보를 확인한다."""
+    try:
+        fresh = time.time() - SITEMAP_CACHE.stat().st_mtime < SITEMAP_CACHE_TTL
+        cached = SITEMAP_CACHE.read_text().strip() if fresh else ""
+    except OSError: cached = ""
+    if cached not in _SITEMAP_CANDIDATES: cached = ""  # SITEMAP_URL 등 후보가 바뀌었으면 다시 탐색
+    if cached and _ok_status(_http_head_or_get(cached)):
+        log.info("[sitemap] 유효 URL(캐시): %s", cached); return
+    candidates = [u for u in _SITEMAP_CANDIDATES if u != cached]
+    with ThreadPoolExecutor(max_workers=len(candidates)) as ex:
+        codes = list(ex.map(_http_head_or_get, candidates))
+    used = next((url for url, code in zip(candidates, codes) if _ok_status(code)), None)
+    if used:
+        log.info("[sitemap] 유효 URL: %s", used)
+        try: _atomic_write(SITEMAP_CACHE, used.encode())
+        except Exception as e: log.warning("[sitemap] 캐시 저장 실패: %s", e)
+    else:
+        log.info("[sitemap] 유효 URL 찾지 못함, 마지막 후보 로그만: %s", candidates[-1])
+
+INDEXNOW_ENDPOINT = "https://api.indexnow.org/indexnow"
+INDEXNOW_MAX_URLS = 10000  # 요청 1건당 urlList 상한
+
+def submit_indexnow(items: List[Dict[str, Any]]) -> None:
+    """이번 실행에서 바뀐 상품 URL 을 IndexNow(Bing/Yandex 등)에 알린다 — sitemap ping 대체. INDEXNOW_KEY 없으면 스킵.
+    active 상품만 — draft/archived 는 스토어프런트 URL 이 404 라 제출하면 쿼터만 쓴다"""
+    if not INDEXNOW_KEY: return
+    urls = [f"https://{INDEXNOW_HOST}/products/{it['handle']}" for it in items
+            if it.get("handle") and it.get("status") == "active"]
+    if not urls: return
+    for i in range(0, len(urls), INDEXNOW_MAX_URLS):
+        body = {"host": INDEXNOW_HOST, "key": INDEXNOW_KEY, "urlList": urls[i:i+INDEXNOW_MAX_URLS]}
+        if INDEXNOW_KEY_URL: body["keyLocation"] = INDEXNOW_KEY_URL
+        with EXT_SESSION.post(INDEXNOW_ENDPOINT, data=_dumps(body), timeout=10,
+                              headers={"Content-Type": "application/json; charset=utf-8"}) as r:
+            if r.status_code in (200, 202): log.info("[indexnow] 제출 %d건 -> %s", len(body["urlList"]), r.status_code)
+            else: log.warning("[indexnow] HTTP %s: %s", r.status_code, (r.text or "")[:200])
 
 # ─────────────────────────────────────────────────────────────
 # Report helper
@@ -335,51 +1361,283 @@ def _submit_daily_report(updated:int, dry:bool, limit:int,
         params = {"auth": IMPORT_AUTH_TOKEN,"perf": perf,"acc": acc,"bp": bp,"seo": seo,
                   "lcp": lcp,"tbt": tbt,"ctr": ctr,"updated": updated,
                   "notes": notes or f"dry={dry}, limit={limit}"}
-        requests.get(f"{PUBLIC_BASE_URL}/report/add", params=params, timeout=8)
+        EXT_SESSION.get(f"{PUBLIC_BASE_URL}/report/add", params=params, timeout=8).close()
     except Exception as e:
         log.warning("[report] submit failed: %s", e)
 
+LAST_UPDATED_PATH = Path("/tmp/last_updated_products.jsonl")
+LAST_UPDATED_SUMMARY = Path("/tmp/last_updated_summary.json")
+
 def _save_last_updated_dump(items: List[Dict[str, Any]], dry: bool, limit: int):
-    """이번 실행에서 실제 업데이트(또는 드라이 모드의 '업데이트 필요')된 상품을 파일로 저장"""
-    payload = {
+    """이번 실행에서 실제 업데이트(또는 드라이 모드의 '업데이트 필요')된 상품을 JSONL 로 저장 + 요약 사이드카
+    한 줄씩 임시 파일에 쓰고 os.replace — 큰 목록도 한 덩어리로 직렬화하지 않고, 읽는 쪽엔 반쯤 쓴 파일이 보이지 않는다"""
+    summary = {
         "ts": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
         "dry": bool(dry),
         "limit": int(limit),
         "count": len(items),
-        "items": items,
+        "path": str(LAST_UPDATED_PATH),
     }
-    path = Path("/tmp/last_updated_products.json")
+    tmp = LAST_UPDATED_PATH.with_name(LAST_UPDATED_PATH.name + ".tmp")
     try:
-        path.write_text(json.dumps(payload, ensure_ascii=False), encoding="utf-8")
+        with open(tmp, "wb") as f:
+            for it in items: f.write(_dumps(it) + b"\n")
+            f.flush(); os.fsync(f.fileno())
+        os.replace(tmp, LAST_UPDATED_PATH)
+        _atomic_write(LAST_UPDATED_SUMMARY, _dumps(summary))  # 요약은 본문 교체 뒤에 — count 가 항상 본문과 맞도록
     except Exception as e:
+        tmp.unlink(missing_ok=True)
         log.warning("[dump] save failed: %s", e)
 
+# ─────────────────────────────────────────────────────────────
+# Preflight (로그용 연결 점검)
+PREFLIGHT_CACHE = Path("/tmp/shop_preflight.json")
+PREFLIGHT_TTL = 60*60
+
+DEBUG_PROBE = os.getenv("DEBUG_PROBE", "0").strip() == "1"
+_PREFLIGHT_DONE = False  # 프로세스 수명 동안 최대 1회 (Flask 워커처럼 오래 사는 프로세스)
+
+def _preflight_due() -> bool:
+    if DEBUG_PROBE or log.isEnabledFor(logging.DEBUG): return True
+    if _PREFLIGHT_DONE: return False
+    try: return time.time() - PREFLIGHT_CACHE.stat().st_mtime >= PREFLIGHT_TTL
+    except OSError: return True
+
+def _preflight() -> bool:
+    """shop.json 으로 연결 점검 — 샘플 상품은 따로 받지 않고 본 목록 조회 결과에서 찍는다(_log_sample).
+    shop.json 은 _get_cached 로 재검증한다 (캐시 항목은 PREFLIGHT_TTL 보다 긴 HTTP_CACHE_TTL 동안 남는다)"""
+    global _PREFLIGHT_DONE
+    _PREFLIGHT_DONE = True
+    try:
+        r, body, _ = _get_cached(f"{BASE}/shop.json")
+        if body is None: return False
+        shop = body.get("shop", {}) or {}
+        log.info("[check] 연결 OK: shop=%s, myshopify=%s, api_version=%s",
+                 shop.get("name"), shop.get("myshopify_domain"), API_VERSION)
+        try: PREFLIGHT_CACHE.write_bytes(_dumps({"name": shop.get("name")}))
+        except Exception: pass
+        return True
+    except Exception:
+        return False
+
+def _log_sample(products: List[Dict[str, Any]], n: int = 5) -> None:
+    log.info("[shopify] 샘플 상품 %d개", min(n, len(products)))
+    for p in products[:n]:
+        log.info(" - %s | %s", p.get("id"), (p.get("title") or "")[:120])
+
+# ─────────────────────────────────────────────────────────────
+# SEO pass
+def _updated_item(p: Dict[str, Any], reason: str, handle: Optional[str] = None) -> Dict[str, Any]:
+    """handle: 실제로 쓴 handle (SEO_UPDATE_HANDLE 로 바뀐 경우) — IndexNow/덤프는 새 URL 기준"""
+    item = {
+        "id": p.get("id"),
+        "title": p.get("title"),
+        "handle": handle or p.get("handle"),
+        "status": p.get("status"),
+        "reason": reason,
+        "admin_url": f"https://admin.shopify.com/store/{STORE}/products/{p.get('id')}",
+    }
+    if handle and handle != p.get("handle"): item["previous_handle"] = p.get("handle")
+    return item
+
+def _written_state(p: Dict[str, Any], seo: Dict[str, str]) -> Dict[str, Any]:
+    """쓰기가 성공한 뒤 Shopify 쪽 상품이 갖게 될 SEO 관련 값"""
+    after = dict(p, metafields_global_title_tag=seo["metafields_global_title_tag"],
+                 metafields_global_description_tag=seo["metafields_global_description_tag"])
+    if SEO_UPDATE_HANDLE: after["handle"] = seo["handle"]
+    targets = {id(img) for img in _alt_targets(p)}
+    after["images"] = [dict(img, alt=seo["alt_text"]) if id(img) in targets else img for img in p.get("images") or []]
+    return after
+
+def _seo_outcome(p: Dict[str, Any], did: bool, reason: str, seo: Optional[Dict[str, str]] = None) -> Tuple[str, str]:
+    if did:
+        # 다음 실행에서 같은 상품이 그대로 돌아오면 needs_update 없이 해시로 바로 스킵되도록 쓴 결과를 기록
+        if seo is not None:
+            after = _written_state(p, seo); _remember_hash(after, _seo_hash(after))
+        log.info("[seo] updated pid=%s (%s)", p.get("id"), reason); return "updated", reason
+    log.info("[seo] skip pid=%s (%s)", p.get("id"), reason)
+    return ("nochange" if reason == "nochange" else "error"), reason
+
+# ── 변경 없음 해시: needs_update 가 읽는 값 + 설정이 지난번 nochange 때와 같으면 비교 자체를 생략
+SEO_HASH_PATH = Path(os.getenv("SEO_HASH_PATH", "/tmp/seo_hash.json"))
+_SEO_HASHES: Dict[str, str] = {}
+
+def _seo_hash(p: Dict[str, Any]) -> str:
+    parts = [p.get("title") or "", str(p.get("tags") or ""), p.get("handle") or "",
+             p.get("metafields_global_title_tag") or "", p.get("metafields_global_description_tag") or "",
+             _seo_rules_sig()]
+    parts += [img.get("alt") or "" for img in p.get("images") or []]
+    return hashlib.blake2b("\x1f".join(parts).encode("utf-8"), digest_size=8).hexdigest()
+
+def _seo_hash_hit(p: Dict[str, Any]) -> Tuple[str, bool]:
+    h = _seo_hash(p)
+    if _media_partial(p): return h, False  # 목록이 잘린 상품은 해시가 일부 ALT 만 덮으므로 쓰지 않는다
+    return h, (not OVERWRITE_ALWAYS and _SEO_HASHES.get(str(p.get("id"))) == h)
+
+_HASH_LOCK = threading.Lock()       # 워커 스레드의 기록 vs 체크포인트 스냅숏
+_HASH_SAVE_LOCK = threading.Lock()  # 같은 .tmp 파일에 두 스레드가 동시에 쓰지 않도록
+SEO_HASH_CHECKPOINT_SEC = 30.0
+_HASH_SAVED_AT = 0.0
+
+def _remember_hash(p: Dict[str, Any], h: str) -> None:
+    if _media_partial(p): return
+    with _HASH_LOCK: _SEO_HASHES[str(p.get("id"))] = h
+
+def _write_seo_hashes() -> None:
+    with _HASH_LOCK: snap = dict(_SEO_HASHES)
+    with _HASH_SAVE_LOCK: _atomic_write(SEO_HASH_PATH, _dumps(snap))
+
+def _checkpoint_seo_hashes() -> None:
+    """SEO 패스 도중 주기적으로 해시를 저장 — 중간에 죽어도 다음 실행은 이미 쓴 상품을 해시로 건너뛰고 이어간다"""
+    global _HASH_SAVED_AT
+    now = time.monotonic()
+    if now - _HASH_SAVED_AT < SEO_HASH_CHECKPOINT_SEC: return
+    _HASH_SAVED_AT = now
+    try: _write_seo_hashes()
+    except Exception as e: log.warning("[seo] 해시 체크포인트 실패: %s", e)
+
+def _load_seo_hashes() -> None:
+    global _SEO_HASHES, _HASH_SAVED_AT
+    _HASH_SAVED_AT = time.monotonic()
+    try: _SEO_HASHES = dict(_loads(SEO_HASH_PATH.read_bytes())) if SEO_HASH_PATH.exists() else {}
+    except Exception: _SEO_HASHES = {}
+
+def _save_seo_hashes(listed: Optional[List[Dict[str, Any]]] = None) -> None:
+    """listed(전체 목록 조회 결과)를 주면 목록에 없는 상품(삭제됨)의 해시는 버린다 — 파일이 끝없이 커지지 않도록
+    (목록이 중간에 끊겨 빠진 상품은 다음 실행에서 needs_update 로 한 번 다시 비교될 뿐)"""
+    global _SEO_HASHES
+    if listed is not None:
+        keep = {str(p.get("id")) for p in listed}
+        with _HASH_LOCK: _SEO_HASHES = {k: v for k, v in _SEO_HASHES.items() if k in keep}
+    try: _write_seo_hashes()
+    except Exception as e: log.warning("[seo] 해시 저장 실패: %s", e)
+
+SeoWork = Tuple[Dict[str, str], str]  # (seo, why)
+
+def _triage(p: Dict[str, Any]) -> Tuple[Optional[Tuple[str, str]], Optional[SeoWork]]:
+    """네트워크 없이 판단 가능한 결과는 바로 (status, reason) 로, 쓰기가 필요하면 (seo, why) 로.
+    status: updated | nochange | skipped | error"""
+    try:
+        if p.get("status") not in ("active", "draft"): return ("skipped", "status"), None
+        h, hit = _seo_hash_hit(p)
+        if hit: return ("nochange", "nochange"), None
+        seo = make_seo(p); why = _seo_need(p, seo)
+        if why is None:
+            _remember_hash(p, h)
+            log.info("[seo] skip pid=%s (nochange)", p.get("id")); return ("nochange", "nochange"), None
+        return None, (seo, why)
+    except Exception as e:
+        log.exception("[seo] failed pid=%s: %s", p.get("id"), e); return ("error", "exception"), None
+
+def _apply(p: Dict[str, Any], work: SeoWork, dry: bool) -> Tuple[str, str]:
+    seo, why = work
+    if dry:
+        log.info("[seo] (dry) would update pid=%s (%s)", p.get("id"), why); return "updated", why
+    try:
+        return _seo_outcome(p, _write_seo(p, seo), why, seo)
+    except Exception as e:
+        log.exception("[seo] failed pid=%s: %s", p.get("id"), e); return "error", "exception"
+
+SeoCounts = Dict[str, int]
+# (상태별 개수, 업데이트된 상품 목록, 앞에서부터 error 없이 끝난 상품 수 — 커서는 여기까지만 전진)
+SeoPassResult = Tuple[SeoCounts, List[Dict[str, Any]], int]
+
+def _tally(products: List[Dict[str, Any]], results: List[Tuple[str, str]]) -> SeoPassResult:
+    counts: SeoCounts = {"updated": 0, "skipped": 0, "nochange": 0, "error": 0}
+    items: List[Dict[str, Any]] = []
+    settled = len(products)
+    for i, (p, (status, reason)) in enumerate(zip(products, results)):
+        counts[status] += 1
+        if status == "error": settled = min(settled, i)
+        if status == "updated":  # make_seo 는 결정적 — 쓴 handle 을 다시 계산 (업데이트된 상품만)
+            items.append(_updated_item(p, reason, make_seo(p)["handle"] if SEO_UPDATE_HANDLE else None))
+    return counts, items, settled
+
+SeoTask = Tuple[int, Dict[str, Any], SeoWork]
+
+def _apply_chunk(chunk: List[SeoTask], dry: bool) -> List[Tuple[int, Tuple[str, str]]]:
+    out = _apply_chunk_once(chunk, dry)
+    if not dry: _checkpoint_seo_hashes()
+    return out
+
+def _apply_chunk_once(chunk: List[SeoTask], dry: bool) -> List[Tuple[int, Tuple[str, str]]]:
+    """상품 여러 개를 alias mutation 1건으로 쓰고, 실패한 상품만 REST 로 다시 쓴다"""
+    if dry or len(chunk) == 1:
+        return [(i, _apply(p, work, dry)) for i, p, work in chunk]
+    try:
+        data = _graphql(*_seo_graphql_batch_request([(p, work[0]) for _, p, work in chunk]))
+    except Exception as e:  # THROTTLED 등 요청 전체 실패 -> 상품별 경로(GraphQL -> REST)
+        log.warning("[seo] GraphQL 배치 실패(%d건) -> 상품별 처리: %s", len(chunk), e)
+        return [(i, _apply(p, work, dry)) for i, p, work in chunk]
+    out: List[Tuple[int, Tuple[str, str]]] = []
+    for k, (i, p, (seo, why)) in enumerate(chunk):
+        errs = _seo_graphql_batch_errors(data, k)
+        if not errs: out.append((i, _seo_outcome(p, True, why, seo))); continue
+        log.warning("[seo] GraphQL userErrors pid=%s: %s -> REST 폴백", p["id"], str(errs)[:300])
+        try: out.append((i, _seo_outcome(p, _update_seo_rest(p, seo), why, seo)))
+        except Exception as e:
+            log.exception("[seo] failed pid=%s: %s", p.get("id"), e); out.append((i, ("error", "exception")))
+    return out
+
+def _chunks(todo: List[SeoTask]) -> List[List[SeoTask]]:
+    """GraphQL 로 쓸 수 있는 상품은 SEO_GQL_BATCH 개씩 묶고, 나머지(REST 전용)는 1개씩"""
+    if not SEO_USE_GRAPHQL or SEO_GQL_BATCH <= 1: return [[t] for t in todo]
+    gql = [t for t in todo if _graphql_writable(t[1])]
+    rest = [[t] for t in todo if not _graphql_writable(t[1])]
+    return [gql[j:j + SEO_GQL_BATCH] for j in range(0, len(gql), SEO_GQL_BATCH)] + rest
+
+def _seo_pass(products: List[Dict[str, Any]], dry: bool) -> SeoPassResult:
+    """상태/해시/needs_update 로 먼저 걸러내고, 실제 쓰기가 필요한 상품만 SEO_GQL_BATCH 개씩 묶어
+    SEO_WORKERS 개 스레드로 겹쳐 보낸다 (429 는 _retry 가 처리)"""
+    results: List[Optional[Tuple[str, str]]] = []; todo: List[SeoTask] = []
+    for i, p in enumerate(products):
+        done, work = _triage(p); results.append(done)
+        if work is not None: todo.append((i, p, work))
+    chunks = [[t] for t in todo] if dry else _chunks(todo)
+    if dry or SEO_WORKERS <= 1 or len(chunks) <= 1:
+        done_items = [r for c in chunks for r in _apply_chunk(c, dry)]
+    else:
+        with ThreadPoolExecutor(max_workers=min(SEO_WORKERS, len(chunks))) as ex:
+            done_items = [r for rs in ex.map(lambda c: _apply_chunk(c, dry), chunks) for r in rs]
+    for i, res in done_items: results[i] = res
+    return _tally(products, results)  # type: ignore[arg-type]
+
+def _background(name: str, fn: Callable[..., Any], **kw) -> threading.Thread:
+    """결과를 기다리지 않는 후처리. daemon 이 아니라서 프로세스 종료 전에는 끝까지 실행된다"""
+    def target():
+        try: fn(**kw)
+        except Exception as e: log.warning("[%s] 백그라운드 작업 실패: %s", name, e)
+    t = threading.Thread(target=target, name=f"seo-{name}", daemon=False); t.start()
+    return t
+
 # ─────────────────────────────────────────────────────────────
 # Public entrypoint
-def run_all(*args, **kwargs) -> Dict[str, int]:
+def _run_args(kwargs: Dict[str, Any]) -> Tuple[bool, int]:
     dry: bool = bool(kwargs.get("dry", False))
     limit_kw = kwargs.get("limit", None)
     try: limit: int = int(limit_kw) if limit_kw is not None else SEO_LIMIT
     except Exception: limit = SEO_LIMIT
+    return dry, limit
+
+def run_all(*args, **kwargs) -> Dict[str, int]:
+    """async_mode=True (또는 SEO_ASYNC=1) 이면 SEO 단계만 aiohttp 이벤트 루프로 실행 (aiohttp 없으면 스레드 풀)"""
+    dry, limit = _run_args(kwargs)
+    if kwargs.get("async_mode", SEO_ASYNC):
+        try:
+            from services import importer_async
+        except ImportError as e:
+            log.warning("[run_all] async 모드 불가(%s) -> 스레드 풀로 실행", e)
+        else:
+            return importer_async.run_all(dry=dry, limit=limit)
+    return _run(dry, limit, _seo_pass)
 
+def _run(dry: bool, limit: int,
+         seo_pass: Callable[[List[Dict[str, Any]], bool], SeoPassResult]) -> Dict[str, int]:
     with RunLock():
         t0 = time.time()
 
-        # 연결 점검 + 샘플
-        try:
-            r = _get(f"{BASE}/shop.json")
-            if r.status_code in (200, 201):
-                shop = r.json().get("shop", {}) or {}
-                log.info("[check] 연결 OK: shop=%s, myshopify=%s, api_version=%s",
-                         shop.get("name"), shop.get("myshopify_domain"), API_VERSION)
-                r2 = _get(f"{BASE}/products.json", params={"limit": 5})
-                if r2.status_code in (200, 201):
-                    prods = r2.json().get("products", []) or []
-                    log.info("[shopify] 샘플 상품 5개")
-                    for p in prods:
-                        log.info(" - %s | %s", p.get("id"), (p.get("title") or "")[:120])
-        except Exception:
-            pass
+        # 연결 점검 + 샘플 (TTL 내 재실행이면 생략)
+        probed = _preflight_due() and _preflight()
 
         # 0) Auto import
         try:
@@ -390,81 +1648,30 @@ def run_all(*args, **kwargs) -> Dict[str, int]:
             log.exception("[run_all] run_auto_import 실패: %s", e)
 
         # 1) SEO UPDATE
-        products = list_products_round_robin(limit) if (limit and limit > 0) else list_all_products()
-        updated = skipped = errors = 0
-        skipped_nochange = 0
-        updated_items: List[Dict[str, Any]] = []
+        round_robin = bool(limit and limit > 0)
+        cursor = _load_cursor() if round_robin else None
+        products = list_products_round_robin(limit, cursor) if round_robin else list_all_products()
+        products = _complete_media(products)
+        if probed: _log_sample(products)
+        _load_seo_hashes()
+        counts, updated_items, settled = seo_pass(products, dry)
+        _save_seo_hashes(None if round_robin else products)
+        updated, errors = counts["updated"], counts["error"]
+        skipped, skipped_nochange = counts["skipped"], counts["nochange"]
 
-        for p in products:
-            try:
-                status = p.get("status")
-                if status not in ("active", "draft"):
-                    skipped += 1; continue
-
-                seo = make_seo(p)
-
-                if dry:
-                    need, why = (True, "force") if OVERWRITE_ALWAYS else needs_update(p, seo)
-                    if need:
-                        updated += 1
-                        updated_items.append({
-                            "id": p.get("id"),
-                            "title": p.get("title"),
-                            "handle": p.get("handle"),
-                            "reason": why,
-                            "admin_url": f"https://admin.shopify.com/store/{STORE}/products/{p.get('id')}",
-                        })
-                        log.info("[seo] (dry) would update pid=%s (%s)", p.get("id"), why)
-                    else:
-                        skipped_nochange += 1
-                        log.info("[seo] (dry) skip pid=%s (nochange)", p.get("id"))
-                    continue
-
-                did, reason = update_product_seo(p, seo)
-                if did:
-                    updated += 1
-                    updated_items.append({
-                        "id": p.get("id"),
-                        "title": p.get("title"),
-                        "handle": p.get("handle"),
-                        "reason": reason,
-                        "admin_url": f"https://admin.shopify.com/store/{STORE}/products/{p.get('id')}",
-                    })
-                    log.info("[seo] updated pid=%s (%s)", p.get("id"), reason)
-                else:
-                    if reason == "nochange": skipped_nochange += 1
-                    else: errors += 1
-                    log.info("[seo] skip pid=%s (%s)", p.get("id"), reason)
-
-            except Exception as e:
-                errors += 1
-                log.exception("[seo] failed pid=%s: %s", p.get("id"), e)
-
-            time.sleep(0.05)  # rate limit 보호
+        # 커서는 실제로 쓴 실행에서, 첫 error 직전 상품까지만 전진 — error 상품부터는 다음 실행에서 다시 처리
+        if round_robin and not dry: _save_cursor(_advance_cursor(cursor, products[:settled]))
 
         log.info("[summary] updated_seo=%d, skipped=%d, skipped_nochange=%d, errors=%d",
                  updated, skipped, skipped_nochange, errors)
 
-        # 2) Sitemap
-        try: resubmit_sitemap()
-        except Exception: pass
-
-        # 3) Daily report
-        _submit_daily_report(updated=updated, dry=dry, limit=limit)
+        # 2) Sitemap, 3) Daily report — 응답을 쓰지 않으므로 백그라운드로 보내고 기다리지 않는다
+        _background("sitemap", resubmit_sitemap)
+        if updated_items and not dry: _background("indexnow", submit_indexnow, items=updated_items)
+        _background("report", _submit_daily_report, updated=updated, dry=dry, limit=limit)
 
         # 4) 이번 실행 변경 목록 저장
         _save_last_updated_dump(updated_items, dry=dry, limit=limit)
 
         log.info("[run_all] 완료 (%.1fs)", time.time() - t0)
         return {"updated_seo": updated, "skipped": skipped + skipped_nochange, "errors": errors}
-
-
-
-
-
-
-
-
-
-
-
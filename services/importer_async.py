@@ -0,0 +1,156 @@
+# services/importer_async.py — services.importer 의 SEO 패스를 aiohttp + asyncio 로 겹쳐 실행
+# -*- coding: utf-8 -*-
+"""
+run_all() 은 services.importer.run_all 과 같은 순서/반환값을 갖는다.
+차이는 1) SEO UPDATE 단계뿐:
+  - SEO_GQL_BATCH 개씩 묶은 GraphQL mutation / 상품별 REST PUT 을 이벤트 루프 하나에서 동시에 진행
+    (Semaphore 로 동시 요청 수 제한, REST 는 services.importer 의 토큰 버킷을 같이 쓴다)
+  - 재시도 대기는 asyncio.sleep — 대기 중에도 다른 상품 요청은 계속 진행
+
+환경변수:
+  SEO_ASYNC_CONCURRENCY (기본 8)
+"""
+
+from __future__ import annotations
+import os, asyncio, logging
+from typing import Any, Dict, List, Optional, Tuple
+
+import aiohttp
+
+from services import importer as base
+
+log = logging.getLogger(__name__)
+
+try:
+    CONCURRENCY = max(1, int(os.getenv("SEO_ASYNC_CONCURRENCY", "8").strip() or 8))
+except Exception:
+    CONCURRENCY = 8
+
+# ─────────────────────────────────────────────────────────────
+# HTTP
+async def _retry(session: aiohttp.ClientSession, method: str, url: str,
+                 *, tries: int = 5, backoff: float = 1.0, **kw) -> Tuple[int, bytes]:
+    last: Optional[Tuple[int, bytes] | Exception] = None
+    limited = base._rate_limited(url)  # REST 는 스레드 경로와 같은 버킷을 나눠 쓴다 (대기는 이벤트 루프를 막지 않게)
+    for i in range(tries):
+        try:
+            if limited:
+                wait = base.RATE.reserve()
+                if wait > 0: await asyncio.sleep(wait)
+            async with session.request(method, url, **kw) as r:
+                body = await r.read()
+                if limited: base._sync_call_limit(r)
+                if r.status in (429, 500, 502, 503, 504):
+                    last = (r.status, body); delay = base._backoff_delay(i, backoff, r.headers)
+                    if limited and r.status == 429: base.RATE.pause(delay)
+                    if i + 1 < tries: await asyncio.sleep(delay)
+                    continue
+                return r.status, body
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:  # ClientTimeout 은 asyncio.TimeoutError 로 온다
+            last = e
+            if i + 1 < tries: await asyncio.sleep(base._backoff_delay(i, backoff))
+            continue
+    if isinstance(last, tuple): return last
+    raise RuntimeError("HTTP 요청 재시도 후 실패") from last  # type: ignore[arg-type]
+
+async def _graphql(session: aiohttp.ClientSession, query: str, variables: Dict[str, Any],
+                   tries: int = 3) -> Dict[str, Any]:
+    payload = base._dumps({"query": query, "variables": variables})
+    for i in range(tries):
+        wait = base.GQL_RATE.reserve(base._gql_cost(query))
+        if wait > 0: await asyncio.sleep(wait)
+        status, raw = await _retry(session, "POST", base.GRAPHQL_URL, data=payload)
+        if status not in (200, 201):
+            raise RuntimeError(f"GraphQL HTTP {status}: {raw[:300]!r}")
+        body = base._loads(raw) or {}
+        base._gql_cost_sync(query, body)
+        if body.get("errors"):
+            if base._gql_throttled(body["errors"]) and i + 1 < tries: continue
+            raise RuntimeError(f"GraphQL errors: {str(body['errors'])[:300]}")
+        return body.get("data") or {}
+    raise RuntimeError("GraphQL THROTTLED 재시도 후 실패")
+
+# ─────────────────────────────────────────────────────────────
+# SEO
+async def _write_seo_async(session: aiohttp.ClientSession, p: Dict[str, Any], seo: Dict[str, str]) -> bool:
+    if base.SEO_USE_GRAPHQL and base._graphql_writable(p):
+        try:
+            errs = base._seo_graphql_errors(await _graphql(session, *base._seo_graphql_request(p, seo)))
+            if not errs: return True
+            log.warning("[seo] GraphQL userErrors pid=%s: %s", p["id"], str(errs)[:300])
+        except Exception as e:
+            log.warning("[seo] GraphQL 실패 -> REST 폴백 pid=%s: %s", p["id"], e)
+    return await _write_seo_rest_async(session, p, seo)
+
+async def _write_seo_rest_async(session: aiohttp.ClientSession, p: Dict[str, Any],
+                                seo: Dict[str, str], split: bool = False) -> bool:
+    reqs = base._seo_rest_requests(p, seo, split)
+    if split and len(reqs) > 1:  # 상품 PUT 과 이미지별 PUT 은 서로 독립 -> 동시에
+        done = await asyncio.gather(*(_retry(session, "PUT", url, data=base._dumps(body)) for url, body in reqs))
+        return all(status in (200, 201) for status, _ in done)
+    ok = True
+    for url, body in reqs:
+        status, raw = await _retry(session, "PUT", url, data=base._dumps(body))
+        if not split and base._rest_image_errors(status, raw):
+            log.warning("[seo] images[] 일괄 PUT 거절 -> 이미지별 PUT pid=%s", p["id"])
+            return await _write_seo_rest_async(session, p, seo, split=True)
+        ok = (status in (200, 201)) and ok
+    return ok
+
+async def _apply_async(session: aiohttp.ClientSession, p: Dict[str, Any], work: base.SeoWork) -> Tuple[str, str]:
+    seo, why = work
+    try:
+        return base._seo_outcome(p, await _write_seo_async(session, p, seo), why, seo)
+    except Exception as e:
+        log.exception("[seo] failed pid=%s: %s", p.get("id"), e); return "error", "exception"
+
+async def _apply_chunk_async(session: aiohttp.ClientSession, sem: asyncio.Semaphore,
+                             chunk: List[base.SeoTask]) -> List[Tuple[int, Tuple[str, str]]]:
+    """base._apply_chunk 와 같은 규칙 — alias mutation 1건, 실패한 상품만 REST 로"""
+    async with sem:
+        if len(chunk) == 1:
+            i, p, work = chunk[0]; return [(i, await _apply_async(session, p, work))]
+        try:
+            data = await _graphql(session, *base._seo_graphql_batch_request([(p, work[0]) for _, p, work in chunk]))
+        except Exception as e:
+            log.warning("[seo] GraphQL 배치 실패(%d건) -> 상품별 처리: %s", len(chunk), e)
+            return [(i, await _apply_async(session, p, work)) for i, p, work in chunk]
+        out: List[Tuple[int, Tuple[str, str]]] = []
+        for k, (i, p, (seo, why)) in enumerate(chunk):
+            errs = base._seo_graphql_batch_errors(data, k)
+            if not errs: out.append((i, base._seo_outcome(p, True, why, seo))); continue
+            log.warning("[seo] GraphQL userErrors pid=%s: %s -> REST 폴백", p["id"], str(errs)[:300])
+            try: out.append((i, base._seo_outcome(p, await _write_seo_rest_async(session, p, seo), why, seo)))
+            except Exception as e:
+                log.exception("[seo] failed pid=%s: %s", p.get("id"), e); out.append((i, ("error", "exception")))
+        return out
+
+async def _checkpointed(coro) -> List[Tuple[int, Tuple[str, str]]]:
+    out = await coro
+    # 주기(SEO_HASH_CHECKPOINT_SEC)가 지났을 때만 실제로 쓴다 — fsync/replace 라서 이벤트 루프 밖에서
+    await asyncio.to_thread(base._checkpoint_seo_hashes)
+    return out
+
+async def seo_pass_async(products: List[Dict[str, Any]], dry: bool) -> base.SeoPassResult:
+    results: List[Optional[Tuple[str, str]]] = []; todo: List[base.SeoTask] = []
+    for i, p in enumerate(products):
+        done, work = base._triage(p); results.append(done)
+        if work is not None: todo.append((i, p, work))
+    if dry or not todo:
+        for i, p, work in todo: results[i] = base._apply(p, work, dry)
+        return base._tally(products, results)  # type: ignore[arg-type]
+    sem = asyncio.Semaphore(CONCURRENCY)
+    # 호스트는 스토어 하나뿐 — DNS 결과와 유휴 keep-alive 연결을 패스 동안 오래 들고 있어 재핸드셰이크를 줄인다
+    connector = aiohttp.TCPConnector(limit=CONCURRENCY * 2, limit_per_host=CONCURRENCY * 2,
+                                     ttl_dns_cache=600, keepalive_timeout=60)
+    timeout = aiohttp.ClientTimeout(total=base.TIMEOUT)
+    async with aiohttp.ClientSession(headers=dict(base.SESSION.headers), connector=connector, timeout=timeout) as session:
+        done = await asyncio.gather(*(_checkpointed(_apply_chunk_async(session, sem, c)) for c in base._chunks(todo)))
+    for i, res in (r for rs in done for r in rs): results[i] = res
+    return base._tally(products, results)  # type: ignore[arg-type]
+
+# ─────────────────────────────────────────────────────────────
+# Public entrypoint
+def run_all(*args, **kwargs) -> Dict[str, int]:
+    dry, limit = base._run_args(kwargs)
+    return base._run(dry, limit, lambda products, d: asyncio.run(seo_pass_async(products, d)))
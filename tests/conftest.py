@@ -0,0 +1,6 @@
+# services.importer 는 import 시점에 SHOPIFY_STORE 를 요구한다 — 테스트용 가짜 스토어로 채우고 저장소 루트를 경로에 넣는다
+import os, sys
+
+os.environ.setdefault("SHOPIFY_STORE", "test-store")
+os.environ.setdefault("SHOPIFY_ADMIN_TOKEN", "test-token")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
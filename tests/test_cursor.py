@@ -0,0 +1,46 @@
+# round-robin 커서가 실제로 처리한 상품까지만 전진하는지 (error 상품은 다음 실행에서 다시, dry 실행은 그대로)
+import contextlib
+
+import pytest
+
+from services import importer as I
+
+
+def _products(n):
+    return [{"id": i, "updated_at": f"2026-01-0{i}T00:00:00Z"} for i in range(1, n + 1)]
+
+
+@pytest.fixture
+def run(monkeypatch):
+    saved = []
+    monkeypatch.setattr(I, "RunLock", contextlib.nullcontext)
+    monkeypatch.setattr(I, "_preflight_due", lambda: False)
+    monkeypatch.setattr(I, "run_auto_import", lambda: (0, 0, 0))
+    monkeypatch.setattr(I, "_load_cursor", lambda: {"updated_at": None, "ids": []})
+    monkeypatch.setattr(I, "_save_cursor", saved.append)
+    monkeypatch.setattr(I, "_complete_media", lambda ps: ps)
+    monkeypatch.setattr(I, "_load_seo_hashes", lambda: None)
+    monkeypatch.setattr(I, "_save_seo_hashes", lambda listed=None: None)
+    monkeypatch.setattr(I, "_background", lambda *a, **k: None)
+    monkeypatch.setattr(I, "_save_last_updated_dump", lambda *a, **k: None)
+
+    def go(statuses, dry=False):
+        products = _products(len(statuses))
+        monkeypatch.setattr(I, "list_products_round_robin", lambda limit, cursor: products)
+        I._run(dry, len(products), lambda ps, d: I._tally(ps, [(s, "") for s in statuses]))
+        return saved
+    return go
+
+
+def test_cursor_stops_before_first_error(run):
+    saved = run(["updated", "nochange", "error", "updated"])
+    assert saved == [{"updated_at": "2026-01-02T00:00:00Z", "ids": [2]}]
+
+
+def test_cursor_untouched_when_first_product_errors(run):
+    saved = run(["error", "updated"])
+    assert saved == [{"updated_at": None, "ids": []}]
+
+
+def test_dry_run_does_not_move_cursor(run):
+    assert run(["updated", "skipped"], dry=True) == []
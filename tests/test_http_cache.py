@@ -0,0 +1,59 @@
+# _get_cached 디스크 캐시 — 오래된 항목도 조건부 GET 으로 재검증하고(한 시간에 한 번 도는 preflight 포함), 쓸 때 정리되는지
+import json
+import os
+import time
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+from services import importer as I
+
+
+def _resp(status, body=b""):
+    r = requests.Response()
+    r.status_code = status
+    r._content = body if isinstance(body, bytes) else json.dumps(body).encode()
+    r._content_consumed = True
+    r.headers = CaseInsensitiveDict({"Content-Type": "application/json"})
+    return r
+
+
+def test_preflight_revalidates_shop_json_after_ttl(monkeypatch, tmp_path):
+    monkeypatch.setattr(I, "HTTP_CACHE_DIR", tmp_path / "http")
+    monkeypatch.setattr(I, "PREFLIGHT_CACHE", tmp_path / "preflight.json")
+    monkeypatch.setattr(I, "_PREFLIGHT_DONE", False)
+    sent = []
+
+    def get(url, headers=None, **kw):
+        sent.append(headers)
+        if headers: return _resp(304)
+        r = _resp(200, {"shop": {"name": "Jeff", "myshopify_domain": "jeff.myshopify.com"}})
+        r.headers["ETag"] = '"s1"'
+        return r
+    monkeypatch.setattr(I.SESSION, "get", get)
+
+    assert I._preflight()
+    old = time.time() - I.PREFLIGHT_TTL - 60
+    for f in (tmp_path / "http").iterdir(): os.utime(f, (old, old))
+
+    assert I._preflight()  # 다음 preflight — 캐시 항목이 PREFLIGHT_TTL 만큼 묵었어도 304 로 끝난다
+    assert sent == [None, {"If-None-Match": '"s1"'}]
+
+
+def test_http_cache_prunes_unused_and_excess_entries(monkeypatch, tmp_path):
+    monkeypatch.setattr(I, "HTTP_CACHE_DIR", tmp_path)
+    monkeypatch.setattr(I, "HTTP_CACHE_MAX_FILES", 3)
+    monkeypatch.setattr(I, "_HTTP_CACHE_PRUNED_AT", 0.0)
+    now = time.time()
+    for i in range(5):  # 오래된 page_info URL 항목들 — 하나는 TTL 을 넘겼다
+        f = tmp_path / f"old{i}.json"; f.write_bytes(b"{}")
+        age = I.HTTP_CACHE_TTL + 60 if i == 0 else i
+        os.utime(f, (now - age, now - age))
+
+    def get(url, headers=None, **kw):
+        r = _resp(200, {"shop": {}}); r.headers["ETag"] = '"s1"'; return r
+    monkeypatch.setattr(I.SESSION, "get", get)
+    I._get_cached(f"{I.BASE}/shop.json")
+
+    assert sorted(f.name for f in tmp_path.iterdir()) == sorted([I._cache_file(f"{I.BASE}/shop.json").name,
+                                                                 "old1.json", "old2.json"])
@@ -0,0 +1,194 @@
+# run_auto_import 의 생성 경로(bulk / productSet 배치 / REST)가 결과를 알 수 없는 실패 뒤에 상품을 다시 만들지 않는지
+import json
+import os
+import time
+
+import pytest
+import requests
+from requests.structures import CaseInsensitiveDict
+
+from services import importer as I
+
+
+def _resp(status, body=b"{}"):
+    r = requests.Response()
+    r.status_code = status
+    r._content = body if isinstance(body, bytes) else json.dumps(body).encode()
+    r._content_consumed = True  # raw 스트림이 없으니 close() 가 건드리지 않게
+    r.headers = CaseInsensitiveDict({"Content-Type": "application/json"})
+    return r
+
+
+class FakeShopify:
+    """SESSION.post 대역 — GraphQL 은 쿼리 종류별 핸들러로, products.json POST 는 REST 생성으로 센다"""
+    def __init__(self, graphql, rest=None):
+        self.graphql = graphql
+        self.rest = rest or (lambda body: _resp(201, {"product": {"id": 900 + len(self.calls)}}))
+        self.calls = []  # (kind, body)
+
+    def post(self, url, data=None, **kw):
+        if url == I.GRAPHQL_URL:
+            body = json.loads(data)
+            kind = next((k for k in ("stagedUploadsCreate", "bulkOperationRunMutation", "ImportBatch",
+                                     "currentBulkOperation") if k in body["query"]), "other")
+            self.calls.append((kind, body))
+            out = self.graphql(kind, body)
+            if isinstance(out, Exception): raise out
+            return out
+        assert url == f"{I.BASE}/products.json", url
+        self.calls.append(("rest_create", json.loads(data)))
+        out = self.rest(json.loads(data))
+        if isinstance(out, Exception): raise out
+        return out
+
+    def count(self, kind):
+        return sum(1 for k, _ in self.calls if k == kind)
+
+
+def _items(n):
+    return [{"title": f"Item {i}", "sku": f"SKU-{i}", "price": "9.99"} for i in range(n)]
+
+
+@pytest.fixture
+def shop(monkeypatch):
+    monkeypatch.setattr(I, "AUTO_IMPORT", True)
+    monkeypatch.setattr(I, "IMPORT_GQL_BATCH", 10)
+    monkeypatch.setattr(I, "should_exclude", lambda it: (False, ""))
+    monkeypatch.setattr(I, "_existing_skus", lambda: set())
+    monkeypatch.setattr(I.time, "sleep", lambda s: None)
+    monkeypatch.setattr(I, "RATE", I.TokenBucket(rate=I.REST_RATE, capacity=40))  # 429 의 pause 가 다음 테스트로 새지 않게
+
+    def install(graphql, items, bulk_min, rest=None):
+        monkeypatch.setattr(I, "fetch_feed", lambda: iter(items))
+        monkeypatch.setattr(I, "IMPORT_BULK_MIN", bulk_min)
+        fake = FakeShopify(graphql, rest)
+        monkeypatch.setattr(I.SESSION, "post", fake.post)
+        monkeypatch.setattr(I.EXT_SESSION, "post", lambda *a, **k: _resp(204, b""))
+        return fake
+    return install
+
+
+def test_bulk_submit_timeout_does_not_recreate(shop):
+    def graphql(kind, body):
+        if kind == "stagedUploadsCreate":
+            return _resp(200, {"data": {"stagedUploadsCreate": {"userErrors": [], "stagedTargets": [
+                {"url": "https://upload.example/", "resourceUrl": None,
+                 "parameters": [{"name": "key", "value": "tmp/products.jsonl"}]}]}}})
+        if kind == "bulkOperationRunMutation":
+            return requests.Timeout("read timed out")  # Shopify 가 받았는지 알 수 없다
+        raise AssertionError(f"unexpected GraphQL call: {kind}")
+    fake = shop(graphql, _items(3), bulk_min=2)
+
+    imported, skipped, errors = I.run_auto_import()
+
+    assert fake.count("bulkOperationRunMutation") == 1  # 제출 POST 는 재전송하지 않는다
+    assert fake.count("ImportBatch") == 0 and fake.count("rest_create") == 0
+    assert (imported, skipped, errors) == (0, 0, 3)
+
+
+def test_partial_alias_data_with_top_level_errors(shop):
+    def graphql(kind, body):
+        assert kind == "ImportBatch"
+        return _resp(200, {
+            "errors": [{"message": "Internal error while resolving s1"}],
+            "data": {"s0": {"product": {"id": "gid://shopify/Product/1"}, "userErrors": []},
+                     "s1": None,
+                     "s2": {"product": {"id": "gid://shopify/Product/3"},
+                            "userErrors": [{"field": ["files"], "message": "image fetch failed"}]}},
+        })
+    fake = shop(graphql, _items(3), bulk_min=50)
+
+    imported, skipped, errors = I.run_auto_import()
+
+    assert fake.count("ImportBatch") == 1
+    assert fake.count("rest_create") == 0  # top-level errors 가 있으면 s1 은 생성 여부 불명 -> 다시 만들지 않는다
+    assert (imported, errors) == (2, 1)
+
+
+def test_alias_user_errors_fall_back_to_rest(shop):
+    def graphql(kind, body):
+        assert kind == "ImportBatch"
+        return _resp(200, {
+            "data": {"s0": {"product": {"id": "gid://shopify/Product/1"}, "userErrors": []},
+                     "s1": {"product": None, "userErrors": [{"field": ["input", "handle"], "message": "taken"}]}},
+        })
+    fake = shop(graphql, _items(2), bulk_min=50)
+
+    imported, skipped, errors = I.run_auto_import()
+
+    rest = [body["product"]["title"] for kind, body in fake.calls if kind == "rest_create"]
+    assert rest == ["Item 1"]  # userErrors 로 거부된 alias 만 REST 로
+    assert (imported, errors) == (2, 0)
+
+
+def test_batch_mutation_5xx_does_not_recreate(shop):
+    def graphql(kind, body):
+        assert kind == "ImportBatch"
+        return _resp(502, b"<html>Bad Gateway</html>")
+    fake = shop(graphql, _items(2), bulk_min=50)
+
+    imported, skipped, errors = I.run_auto_import()
+
+    assert fake.count("ImportBatch") == 1  # 5xx 뒤 mutation 재전송 없음
+    assert fake.count("rest_create") == 0
+    assert (imported, errors) == (0, 2)
+
+
+def test_rest_create_timeout_is_not_resent(shop, monkeypatch):
+    monkeypatch.setattr(I, "IMPORT_GQL_BATCH", 1)  # 건별 REST 경로
+    def graphql(kind, body): raise AssertionError(f"unexpected GraphQL call: {kind}")
+    fake = shop(graphql, _items(1), bulk_min=50, rest=lambda body: requests.ReadTimeout("read timed out"))
+
+    imported, skipped, errors = I.run_auto_import()
+
+    assert fake.count("rest_create") == 1  # 생성 여부를 모르는 POST 는 다시 보내지 않는다
+    assert (imported, errors) == (0, 1)
+
+
+def test_rest_create_retries_only_429(shop, monkeypatch):
+    monkeypatch.setattr(I, "IMPORT_GQL_BATCH", 1)
+    answers = iter([_resp(429, {"errors": "Exceeded"}), _resp(201, {"product": {"id": 7}})])
+    def graphql(kind, body): raise AssertionError(f"unexpected GraphQL call: {kind}")
+    fake = shop(graphql, _items(1), bulk_min=50, rest=lambda body: next(answers))
+
+    imported, skipped, errors = I.run_auto_import()
+
+    assert fake.count("rest_create") == 2
+    assert (imported, errors) == (1, 0)
+
+
+def test_existing_skus_reuses_cached_pages_on_304(monkeypatch, tmp_path):
+    monkeypatch.setattr(I, "HTTP_CACHE_DIR", tmp_path)
+    sent = []
+
+    def get(url, headers=None, **kw):
+        sent.append(headers)
+        if headers and headers.get("If-None-Match") == '"v1"': return _resp(304, b"")
+        r = _resp(200, {"products": [{"variants": [{"sku": "A"}, {"sku": ""}]}, {"variants": [{"sku": "B"}]}]})
+        r.headers["ETag"] = '"v1"'
+        return r
+    monkeypatch.setattr(I.SESSION, "get", get)
+
+    assert I._existing_skus() == {"A", "B"}
+    assert I._existing_skus() == {"A", "B"}  # 두 번째 sweep 은 304 -> 디스크 캐시의 SKU
+    assert sent == [None, {"If-None-Match": '"v1"'}]
+
+
+def test_existing_skus_revalidates_cache_older_than_ttl(monkeypatch, tmp_path):
+    monkeypatch.setattr(I, "HTTP_CACHE_DIR", tmp_path)
+    sent = []
+
+    def get(url, headers=None, **kw):
+        sent.append(headers)
+        if headers: return _resp(304, b"")
+        r = _resp(200, {"products": [{"variants": [{"sku": "A"}]}]})
+        r.headers["ETag"] = '"v1"'; r.headers["Last-Modified"] = "Wed, 01 Jan 2026 00:00:00 GMT"
+        return r
+    monkeypatch.setattr(I.SESSION, "get", get)
+
+    I._existing_skus()
+    old = time.time() - I.HTTP_CACHE_TTL - 60  # 다음 import 가 TTL 이 지나서 돈다
+    for f in tmp_path.iterdir(): os.utime(f, (old, old))
+
+    assert I._existing_skus() == {"A"}
+    assert sent[1] == {"If-None-Match": '"v1"', "If-Modified-Since": "Wed, 01 Jan 2026 00:00:00 GMT"}
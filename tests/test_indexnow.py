@@ -0,0 +1,32 @@
+# submit_indexnow 가 스토어프런트에서 열리는 상품 URL 만 제출하는지
+import json
+
+from services import importer as I
+
+
+def test_draft_products_are_not_submitted(monkeypatch):
+    sent = []
+
+    class _Resp:
+        status_code = 200; text = ""
+        def __enter__(self): return self
+        def __exit__(self, *a): return False
+
+    def post(url, data=None, **kw):
+        sent.append(json.loads(data)); return _Resp()
+    monkeypatch.setattr(I, "INDEXNOW_KEY", "k")
+    monkeypatch.setattr(I, "INDEXNOW_HOST", "shop.example")
+    monkeypatch.setattr(I.EXT_SESSION, "post", post)
+
+    I.submit_indexnow([I._updated_item({"id": 1, "handle": "live", "status": "active"}, "seo"),
+                       I._updated_item({"id": 2, "handle": "wip", "status": "draft"}, "seo")])
+
+    assert [b["urlList"] for b in sent] == [["https://shop.example/products/live"]]
+
+
+def test_nothing_sent_when_only_drafts(monkeypatch):
+    monkeypatch.setattr(I, "INDEXNOW_KEY", "k")
+    def post(*a, **kw): raise AssertionError("IndexNow 에 제출됨")
+    monkeypatch.setattr(I.EXT_SESSION, "post", post)
+
+    I.submit_indexnow([I._updated_item({"id": 2, "handle": "wip", "status": "draft"}, "seo")])
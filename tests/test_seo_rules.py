@@ -0,0 +1,27 @@
+# SEO 생성 규칙이 바뀌면 nochange 해시와 round-robin 커서 서명이 함께 무효가 되는지
+import pytest
+
+from services import importer as I
+
+_P = {"id": 1, "title": "Lamp", "tags": "desk", "handle": "lamp",
+      "metafields_global_title_tag": "Lamp | x", "metafields_global_description_tag": "d", "images": []}
+
+
+@pytest.mark.parametrize("name, value", [
+    ("_DESC_TAIL", " Ships worldwide."), ("TITLE_MAX", 70), ("DESC_MAX", 150), ("SEO_RULES_VERSION", 2),
+])
+def test_rule_change_invalidates_hash(monkeypatch, name, value):
+    before = I._seo_hash(_P)
+    monkeypatch.setattr(I, name, value)
+    assert I._seo_hash(_P) != before
+
+
+@pytest.mark.parametrize("name, value", [("_DESC_TAIL", " Ships worldwide."), ("DESC_MAX", 150)])
+def test_rule_change_restarts_cursor(monkeypatch, tmp_path, name, value):
+    monkeypatch.setattr(I, "SEO_CURSOR_PATH", tmp_path / "cursor.json")
+    monkeypatch.setattr(I, "_LAST_CURSOR", None)
+    I._save_cursor({**I._fresh_cursor(), "updated_at": "2026-01-01T00:00:00Z", "ids": [1]})
+    assert I._load_cursor()["updated_at"] == "2026-01-01T00:00:00Z"
+
+    monkeypatch.setattr(I, name, value)
+    assert I._load_cursor()["updated_at"] is None